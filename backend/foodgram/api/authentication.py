@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+User = get_user_model()
+
+# Хеш пароля не кешируется: при обращении он будет загружен из БД
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+
+class LocalCache:
+    """LRU-кеш в памяти процесса с ограниченным временем жизни записей"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+local_tokens = LocalCache(
+    settings.AUTH_TOKEN_LOCAL_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def get_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def make_snapshot(user):
+    return tuple(getattr(user, name) for name in SNAPSHOT_FIELDS)
+
+
+def from_snapshot(snapshot):
+    return User.from_db(router.db_for_read(User), SNAPSHOT_FIELDS, snapshot)
+
+
+def get_shared_cache():
+    """Общий кеш воркеров или None. У LocMemCache кеш в каждом
+    процессе свой: отзыв токена в одном воркере не сбросил бы
+    снимок в остальных на AUTH_TOKEN_CACHE_TTL секунд"""
+    shared = caches['default']
+    if isinstance(shared, LocMemCache):
+        return None
+    return shared
+
+
+def invalidate_token(key):
+    local_tokens.delete(key)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete(get_cache_key(key))
+
+
+def invalidate_user(user):
+    for key in Token.objects.filter(user=user).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к БД при попадании в кеш.
+
+    Снимок пользователя хранится AUTH_TOKEN_LOCAL_TTL секунд в памяти
+    воркера и AUTH_TOKEN_CACHE_TTL секунд в общем кеше (memcached).
+    Общий кеш сбрасывается сигналами при выходе, смене пароля
+    и деактивации. С кешем в памяти процесса второй уровень
+    отключён, и отозванный токен живёт не дольше AUTH_TOKEN_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = local_tokens.get(key)
+        if snapshot is None:
+            shared = get_shared_cache()
+            if shared is not None:
+                snapshot = shared.get(get_cache_key(key))
+            if snapshot is None:
+                try:
+                    token = Token.objects.select_related('user').get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                snapshot = make_snapshot(token.user)
+                if shared is not None:
+                    shared.set(get_cache_key(key), snapshot,
+                               settings.AUTH_TOKEN_CACHE_TTL)
+            local_tokens.set(key, snapshot)
+        user = from_snapshot(snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
@@ -0,0 +1,181 @@
+"""Пакетные запросы: несколько вызовов API за один HTTP-запрос.
+
+Подзапросы выполняются в процессе, минуя middleware, с пользователем
+и токеном пакета. Идущие подряд GET выполняются параллельно
+в пуле потоков; остальные методы выполняются по порядку в потоке
+запроса на его соединении и служат границей между группами GET.
+Поток пула держит своё соединение между подзапросами так же, как
+воркер между запросами, а с DB_POOL берёт его из пула процесса
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+
+
+API_PREFIX = '/api'
+
+logger = logging.getLogger(__name__)
+
+factory = RequestFactory()
+
+executors = {}
+executors_lock = threading.Lock()
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(
+        ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'), default='GET')
+    url = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+
+    def validate_url(self, value):
+        path = urlsplit(value).path
+        if not path.startswith(f'{API_PREFIX}/'):
+            raise serializers.ValidationError(
+                f'Адрес должен начинаться с {API_PREFIX}/')
+        try:
+            match = resolve(path[len(API_PREFIX):], 'api.urls')
+        except Resolver404:
+            raise serializers.ValidationError('Неизвестный адрес')
+        if match.url_name == 'batch':
+            raise serializers.ValidationError(
+                'Пакет не может содержать пакетные запросы')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'Не больше {settings.BATCH_MAX_REQUESTS} запросов в пакете')
+        return value
+
+
+def get_executor():
+    """Пул потоков текущего процесса: после fork воркер создаёт свой"""
+    with executors_lock:
+        pid, executor = executors.get('batch', (None, None))
+        if pid != os.getpid():
+            executor = ThreadPoolExecutor(
+                settings.BATCH_WORKERS, thread_name_prefix='batch')
+            executors['batch'] = (os.getpid(), executor)
+        return executor
+
+
+def build_request(request, item):
+    """Подзапрос с заголовками и пользователем пакета"""
+    meta = {
+        name: request.META[name]
+        for name in ('HTTP_AUTHORIZATION', 'HTTP_HOST', 'HTTP_ACCEPT',
+                     'HTTP_X_FORWARDED_FOR', 'REMOTE_ADDR')
+        if name in request.META
+    }
+    meta['wsgi.url_scheme'] = request.scheme
+    body = item.get('body')
+    sub_request = factory.generic(
+        item['method'],
+        item['url'],
+        data=json.dumps(body) if body is not None else '',
+        content_type='application/json',
+        **meta
+    )
+    if request.user.is_authenticated:
+        # Подзапросы не проверяют токен повторно
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def execute(sub_request):
+    path = urlsplit(sub_request.path).path[len(API_PREFIX):]
+    match = resolve(path, 'api.urls')
+    sub_request.resolver_match = match
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    result = {'status': response.status_code, 'body': None}
+    if response.has_header('Location'):
+        result['location'] = response['Location']
+    if (not getattr(response, 'streaming', False)
+            and response.get('Content-Type', '').startswith(
+                'application/json')
+            and response.content):
+        result['body'] = json.loads(response.content)
+    elif response.status_code < 400 and response.has_header('Content-Type'):
+        # Файлы пакетом не передаются
+        result['content_type'] = response['Content-Type']
+    return result
+
+
+def execute_safely(sub_request):
+    """Ошибка подзапроса не прерывает остальные"""
+    try:
+        return execute(sub_request)
+    except Exception:
+        logger.exception('Ошибка подзапроса %s %s',
+                         sub_request.method, sub_request.path)
+        return {'status': 500, 'body': {'error': 'Внутренняя ошибка'}}
+
+
+def execute_in_thread(sub_request):
+    """Закрываются только устаревшие по CONN_MAX_AGE и сломанные
+    соединения; с DB_POOL соединение возвращается в пул"""
+    close_old_connections()
+    try:
+        return execute_safely(sub_request)
+    finally:
+        close_old_connections()
+
+
+def timed_out():
+    return {'status': 504, 'body': {
+        'error': f'Пакет не уложился в {settings.BATCH_TIMEOUT} с'}}
+
+
+def run_batch(request, items):
+    """Выполняет подзапросы и возвращает их результаты по порядку"""
+    deadline = time.monotonic() + settings.BATCH_TIMEOUT
+    results = [None] * len(items)
+    index = 0
+    while index < len(items):
+        end = index
+        while end < len(items) and items[end]['method'] == 'GET':
+            end += 1
+        if end - index > 1 and settings.BATCH_WORKERS > 1:
+            executor = get_executor()
+            futures = {
+                executor.submit(
+                    execute_in_thread, build_request(request, items[i])): i
+                for i in range(index, end)
+            }
+            done, not_done = wait(
+                futures, timeout=max(deadline - time.monotonic(), 0))
+            for future in not_done:
+                # Поток не прервать: результат будет отброшен
+                future.cancel()
+                results[futures[future]] = timed_out()
+            for future in done:
+                results[futures[future]] = future.result()
+            index = end
+            continue
+        end = max(end, index + 1)
+        for i in range(index, end):
+            if time.monotonic() >= deadline:
+                results[i] = timed_out()
+            else:
+                results[i] = execute_safely(
+                    build_request(request, items[i]))
+        index = end
+    return results
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import DB_CONNECTIONS_OPENED, DB_HEALTH_CHECK_FAILURES
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    # Физические подключения пула считает сам пул
+    if not getattr(connection, 'pooled', False):
+        DB_CONNECTIONS_OPENED.labels(connection.alias).inc()
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Проверяет постоянные соединения, простоявшие дольше
+    DB_HEALTH_CHECK_IDLE, чтобы запрос не упал на соединении,
+    которое база или балансировщик уже закрыли. Соединения пула
+    проверяет сам пул, когда выдаёт их"""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        last_used = getattr(connection, 'last_used', None)
+        if (last_used is not None
+                and now - last_used < settings.DB_HEALTH_CHECK_IDLE):
+            continue
+        if not connection.is_usable():
+            DB_HEALTH_CHECK_FAILURES.labels(connection.alias).inc()
+            connection.close()
+
+
+@receiver(request_finished)
+def mark_used(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.last_used = now
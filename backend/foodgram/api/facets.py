@@ -0,0 +1,99 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from .filters import RecipeFilter
+from recipes.models import Recipe, Tag
+
+
+# Границы корзин времени приготовления в минутах
+COOKING_TIME_BUCKETS = (15, 30, 60, 120)
+
+# Фасет считается без собственных фильтров: счётчик тега показывает,
+# сколько рецептов вернёт выбор этого тега при остальных фильтрах
+FACET_PARAMS = {
+    'tags': ('tags',),
+    'cooking_time': ('cooking_time_min', 'cooking_time_max'),
+}
+
+# Эти фильтры зависят от пользователя, поэтому он входит в ключ кеша
+USER_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def tag_facet(queryset):
+    counts = Tag.objects.annotate(count=Count(
+        'recipes', filter=Q(recipes__in=queryset.order_by().values('pk'))
+    )).order_by('id').values('id', 'slug', 'count')
+    return list(counts)
+
+
+def cooking_time_facet(queryset):
+    bounds = (0,) + COOKING_TIME_BUCKETS + (None,)
+    buckets = list(zip(bounds, bounds[1:]))
+    counts = queryset.aggregate(**{
+        f'bucket{index}': Count('pk', filter=Q(
+            cooking_time__gte=low,
+            **({'cooking_time__lt': high} if high else {})
+        ))
+        for index, (low, high) in enumerate(buckets)
+    })
+    return [
+        {'min': low, 'max': high, 'count': counts[f'bucket{index}']}
+        for index, (low, high) in enumerate(buckets)
+    ]
+
+
+FACETS = {
+    'tags': tag_facet,
+    'cooking_time': cooking_time_facet,
+}
+
+
+def get_cache_key(name, params, user):
+    """Ключ не зависит от порядка параметров и от параметров,
+    не влияющих на фильтрацию"""
+    parts = [name]
+    for key in sorted(RecipeFilter.base_filters):
+        if key in FACET_PARAMS[name] or key == 'ordering':
+            continue
+        values = sorted(value for value in params.getlist(key) if value)
+        if values:
+            parts.append(f'{key}={",".join(values)}')
+            if key in USER_PARAMS and user.is_authenticated:
+                parts.append(f'user={user.pk}')
+    digest = hashlib.md5('&'.join(parts).encode()).hexdigest()
+    return f'facets:{digest}'
+
+
+def get_requested_facets(query_params):
+    names = [name for name in query_params.get('facets', '').split(',')
+             if name]
+    unknown = set(names) - set(FACETS)
+    if unknown:
+        raise ValidationError({'facets': [
+            f'Неизвестные фасеты: {", ".join(sorted(unknown))}. '
+            f'Доступны: {", ".join(FACETS)}'
+        ]})
+    return names
+
+
+def get_facets(request, names):
+    """Фасеты списка рецептов, по одному групповому запросу на фасет"""
+    facets = {}
+    for name in names:
+        key = get_cache_key(name, request.query_params, request.user)
+        facet = cache.get(key)
+        if facet is None:
+            params = request.query_params.copy()
+            for param in FACET_PARAMS[name]:
+                params.pop(param, None)
+            queryset = RecipeFilter(
+                params, queryset=Recipe.objects.alive(),
+                request=request).qs
+            facet = FACETS[name](queryset)
+            cache.set(key, facet, settings.FACETS_CACHE_TTL)
+        facets[name] = facet
+    return facets
@@ -1,6 +1,8 @@
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Coalesce
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
 
 
 class IngredientFilter(filters.FilterSet):
@@ -12,13 +14,22 @@ class IngredientFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
+    ORDERINGS = ('popular', 'trending')
+
     tags = filters.CharFilter(field_name='tags__slug', method='tags_filter')
     is_favorited = filters.NumberFilter(method='favourites')
     is_in_shopping_cart = filters.NumberFilter(method='cart')
+    cooking_time_min = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte')
+    cooking_time_max = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS], method='order')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'cooking_time_min', 'cooking_time_max', 'ordering']
 
     def favourites(self, queryset, name, value):
         user = self.request.user
@@ -32,6 +43,13 @@ class RecipeFilter(filters.FilterSet):
             queryset = queryset.filter(consumers__user=user)
         return queryset
 
+    def order(self, queryset, name, value):
+        """Сортировка по предрассчитанному счёту. Рецепт без строки
+        счёта, например созданный в обход сигнала, идёт с нулём"""
+        return queryset.order_by(
+            Coalesce(f'score__{value}', Value(0.0, FloatField())).desc(),
+            F('id').desc())
+
     def tags_filter(self, queryset, name, value):
-        tags = self.request.query_params.getlist('tags') 
+        tags = self.request.query_params.getlist('tags')
         return queryset.filter(tags__slug__in=tags).distinct()
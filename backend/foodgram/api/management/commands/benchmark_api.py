@@ -0,0 +1,318 @@
+import contextlib
+import io
+import json
+import math
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Cart, Favourite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+
+
+User = get_user_model()
+
+Scenario = namedtuple(
+    'Scenario', ('name', 'method', 'path', 'params', 'auth', 'body'))
+
+
+def percentile(samples, rank):
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(samples)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class QueryCounter:
+    """Считает SQL-запросы через connection.execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextlib.contextmanager
+    def capture(self):
+        self.count = 0
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число SQL-запросов и память '
+            'для каждого эндпоинта API на заполненной базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', default='',
+                            help='Запускать сценарии, содержащие подстроку')
+        parser.add_argument('--user', default='',
+                            help='username пользователя для запросов')
+        parser.add_argument('--host', default='',
+                            help='Значение заголовка Host')
+        parser.add_argument('--output', default='',
+                            help='Файл для JSON с результатами')
+        parser.add_argument('--baseline', default='',
+                            help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=1.2,
+                            help='Допустимый рост p95 относительно baseline')
+
+    def handle(self, *args, **options):
+        self.handler = WSGIHandler()
+        self.host = options['host'] or settings.ALLOWED_HOSTS[0]
+        self.user = self.get_user(options['user'])
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        # Корзины ограничений ответили бы 429 вместо работы view,
+        # а кеш ответов гостям — HIT без запросов к БД
+        with override_settings(THROTTLE_BUCKETS={}, RESPONSE_CACHE_TTL=0):
+            results = self.measure_all(options)
+        report = json.dumps(
+            {
+                'meta': {
+                    'iterations': options['iterations'],
+                    'database': connections['default'].vendor,
+                    'recipes': Recipe.objects.count(),
+                    'users': User.objects.count(),
+                    'python': sys.version.split()[0],
+                },
+                'endpoints': results,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+        failed = [
+            f'{name}: {result["status"]}'
+            for name, result in results.items()
+            if not 200 <= result['status'] < 300
+        ]
+        if failed:
+            raise CommandError(
+                'Замеры ответов с ошибкой недостоверны: ' + ', '.join(failed))
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def measure_all(self, options):
+        results = {}
+        for scenario in self.build_scenarios():
+            if options['only'] not in scenario.name:
+                continue
+            results[scenario.name] = self.measure(
+                scenario, options['iterations'], options['warmup'])
+            self.stderr.write(
+                '{name}: p95 {p95_ms} ms, {queries} queries'.format(
+                    name=scenario.name, **results[scenario.name]))
+        return results
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            return User.objects.get(username=username)
+        follower_id = Follow.objects.filter(
+            follower__cart__isnull=False
+        ).values_list('follower_id', flat=True).first()
+        user = (User.objects.filter(pk=follower_id).first()
+                or User.objects.first())
+        if user is None:
+            raise CommandError(
+                'База пуста, сначала выполните generate_fake_data')
+        return user
+
+    def build_scenarios(self):
+        """Сценарии для всех маршрутов api/urls.py, кроме смены пароля,
+        регистрации и выдачи токена, которые меняют учётные данные"""
+        recipe = Recipe.objects.first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов')
+        free_recipe = Recipe.objects.exclude(
+            pk__in=Favourite.objects.filter(
+                user=self.user).values('recipe_id')
+        ).exclude(
+            pk__in=Cart.objects.filter(user=self.user).values('recipe_id')
+        ).first()
+        author = User.objects.exclude(pk=self.user.pk).exclude(
+            pk__in=Follow.objects.filter(
+                follower=self.user).values('following_id')
+        ).first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.filter(
+            pk__in=RecipeIngredient.objects.values('ingredient_id')[:1]
+        ).first() or Ingredient.objects.first()
+
+        def get(name, path, params=None, auth=False):
+            return Scenario(name, 'GET', path, params or {}, auth, None)
+
+        scenarios = [
+            get('recipes-list', '/api/recipes/'),
+            get('recipes-list-auth', '/api/recipes/', auth=True),
+            get('recipes-list-limit', '/api/recipes/', {'limit': 50}, True),
+            get('recipes-list-page', '/api/recipes/', {'page': 10}, True),
+            get('recipes-list-author', '/api/recipes/',
+                {'author': recipe.author_id}, True),
+            get('recipes-list-favorited', '/api/recipes/',
+                {'is_favorited': 1}, True),
+            get('recipes-list-cart', '/api/recipes/',
+                {'is_in_shopping_cart': 1}, True),
+            get('recipes-detail', f'/api/recipes/{recipe.pk}/', auth=True),
+            get('recipes-download-shopping-cart',
+                '/api/recipes/download_shopping_cart/', auth=True),
+            get('users-list', '/api/users/', auth=True),
+            get('users-detail', f'/api/users/{recipe.author_id}/',
+                auth=True),
+            get('users-me', '/api/users/me/', auth=True),
+            get('users-subscriptions', '/api/users/subscriptions/',
+                auth=True),
+            get('ingredients-list', '/api/ingredients/'),
+            get('tags-list', '/api/tags/'),
+        ]
+        if tags:
+            scenarios += [
+                get('recipes-list-tag', '/api/recipes/',
+                    {'tags': tags[:1]}, True),
+                get('recipes-list-tags', '/api/recipes/',
+                    {'tags': tags}, True),
+                get('recipes-list-tags-favorited', '/api/recipes/',
+                    {'tags': tags, 'is_favorited': 1}, True),
+                get('recipes-list-tags-cart-author', '/api/recipes/',
+                    {'tags': tags, 'is_in_shopping_cart': 1,
+                     'author': recipe.author_id}, True),
+            ]
+        if tag is not None:
+            scenarios.append(get('tags-detail', f'/api/tags/{tag.pk}/'))
+        if ingredient is not None:
+            scenarios += [
+                get('ingredients-search', '/api/ingredients/',
+                    {'name': ingredient.name[:2]}),
+                get('ingredients-detail',
+                    f'/api/ingredients/{ingredient.pk}/'),
+            ]
+        if free_recipe is not None:
+            for action in ('favorite', 'shopping_cart'):
+                path = f'/api/recipes/{free_recipe.pk}/{action}/'
+                scenarios += [
+                    Scenario(f'recipes-{action}-post', 'POST', path,
+                             {}, True, {}),
+                    Scenario(f'recipes-{action}-delete', 'DELETE', path,
+                             {}, True, None),
+                ]
+        if author is not None:
+            path = f'/api/users/{author.pk}/subscribe/'
+            scenarios += [
+                Scenario('users-subscribe-post', 'POST', path, {}, True, {}),
+                Scenario('users-subscribe-delete', 'DELETE', path,
+                         {}, True, None),
+            ]
+        return scenarios
+
+    def request(self, scenario):
+        body = b''
+        if scenario.body is not None:
+            body = json.dumps(scenario.body).encode()
+        environ = {
+            'REQUEST_METHOD': scenario.method,
+            'PATH_INFO': scenario.path,
+            'QUERY_STRING': urlencode(scenario.params, doseq=True),
+            'HTTP_HOST': self.host,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+        }
+        if scenario.auth:
+            environ['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        setup_testing_defaults(environ)
+        statuses = []
+        response = self.handler(
+            environ, lambda status, headers, *args: statuses.append(status))
+        size = 0
+        try:
+            for chunk in response:
+                size += len(chunk)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        return int(statuses[0].split()[0]), size
+
+    def measure(self, scenario, iterations, warmup):
+        """Для POST/DELETE каждый прогон готовит и восстанавливает
+        состояние парным запросом"""
+        counter = QueryCounter()
+        timings = []
+        queries = []
+        for index in range(warmup + iterations):
+            self.prepare(scenario)
+            start = time.perf_counter()
+            with counter.capture():
+                status, size = self.request(scenario)
+            elapsed = time.perf_counter() - start
+            self.restore(scenario)
+            if index >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+        self.prepare(scenario)
+        tracemalloc.start()
+        try:
+            self.request(scenario)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            self.restore(scenario)
+        return {
+            'status': status,
+            'bytes': size,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def prepare(self, scenario):
+        if scenario.method == 'DELETE':
+            self.request(scenario._replace(method='POST', body={}))
+
+    def restore(self, scenario):
+        if scenario.method == 'POST':
+            self.request(scenario._replace(method='DELETE', body=None))
+
+    def compare(self, results, path, tolerance):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['endpoints']
+        regressions = []
+        for name, current in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f'{name}: {current["queries"]} queries '
+                    f'(baseline {previous["queries"]})')
+            if current['p95_ms'] > previous['p95_ms'] * tolerance:
+                regressions.append(
+                    f'{name}: p95 {current["p95_ms"]} ms '
+                    f'(baseline {previous["p95_ms"]} ms)')
+        if regressions:
+            raise CommandError(
+                'Регрессия относительно baseline:\n' + '\n'.join(regressions))
+        self.stderr.write(self.style.SUCCESS('Регрессий нет'))
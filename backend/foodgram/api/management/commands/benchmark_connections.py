@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .benchmark_api import Command as BenchmarkCommand
+from .benchmark_api import Scenario
+
+
+class Command(BenchmarkCommand):
+    help = ('Сравнивает задержку /api/tags/ с подключением к базе '
+            'на каждый запрос и с постоянными соединениями')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--path', default='/api/tags/')
+        parser.add_argument('--max-age', type=int, default=60,
+                            help='CONN_MAX_AGE для постоянных соединений')
+
+    def handle(self, *args, **options):
+        self.handler = WSGIHandler()
+        self.host = settings.ALLOWED_HOSTS[0]
+        scenario = Scenario(
+            'connections', 'GET', options['path'], {}, False, None)
+        modes = [('новое соединение', 0),
+                 ('постоянное соединение', options['max_age'])]
+        opened = []
+        connection_created.connect(
+            lambda **kwargs: opened.append(1), weak=False)
+        for name, max_age in modes:
+            for connection in connections.all():
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+            opened.clear()
+            result = self.measure(
+                scenario, options['iterations'], options['warmup'])
+            self.stdout.write(
+                f'{name}: p50 {result["p50_ms"]} ms, '
+                f'p95 {result["p95_ms"]} ms, p99 {result["p99_ms"]} ms, '
+                f'подключений {len(opened)}')
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from .benchmark_api import percentile
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость и вывод GetRecipeSerializer и '
+            'serialize_recipes для списка и просмотра рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', default='',
+                            help='username пользователя для запросов')
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов')
+        user = (User.objects.get(username=options['user'])
+                if options['user'] else User.objects.first())
+        token = Token.objects.get_or_create(user=user)[0].key
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+            HTTP_AUTHORIZATION=f'Token {token}',
+        )
+        for name, path in (
+            ('list', f'/api/recipes/?limit={options["limit"]}'),
+            ('detail', f'/api/recipes/{recipe.pk}/'),
+        ):
+            results = {}
+            for flat in (False, True):
+                with override_settings(RECIPES_FLAT_SERIALIZER=flat):
+                    results[flat] = self.measure(
+                        client, path, options['iterations'])
+            (drf_ms, drf_body), (flat_ms, flat_body) = (
+                results[False], results[True])
+            if drf_body != flat_body:
+                raise CommandError(f'{name}: ответы различаются')
+            self.stdout.write(
+                f'{name}: DRF p50 {drf_ms:.2f} ms, '
+                f'flat p50 {flat_ms:.2f} ms, '
+                f'ускорение x{drf_ms / flat_ms:.2f}, ответы совпадают')
+
+    @staticmethod
+    def measure(client, path, iterations):
+        timings = []
+        for _ in range(iterations + 1):
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path}: {response.status_code}')
+        return percentile(timings[1:], 50), response.content
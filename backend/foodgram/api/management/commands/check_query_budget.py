@@ -0,0 +1,276 @@
+import base64
+import contextlib
+import io
+import tempfile
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from .benchmark_api import Command as BenchmarkCommand
+from .benchmark_api import Scenario
+from api.query_budget import QUERY_BUDGETS, SKIPPED, QueryRecorder
+from api.urls import router
+from jobs.models import Job
+from recipes.models import (Cart, Favourite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.snapshots import refresh_snapshots
+
+
+User = get_user_model()
+
+SEED_PREFIX = 'query-budget'
+
+
+def make_image():
+    """Картинка 1×1 для создания и изменения рецептов"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@contextlib.contextmanager
+def keep_connections():
+    """Запросы идут внутри откатываемой транзакции, поэтому соединение
+    нельзя закрывать между ними, как это делает тестовый клиент Django"""
+    for signal in (request_started, request_finished):
+        signal.disconnect(close_old_connections)
+    try:
+        yield
+    finally:
+        for signal in (request_started, request_finished):
+            signal.connect(close_old_connections)
+
+
+class Command(BenchmarkCommand):
+    help = ('Проверяет число SQL-запросов каждого действия DefaultRouter '
+            'из api/urls.py на двух размерах страницы по бюджетам '
+            'api.query_budget. Данные создаются и откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs=2,
+                            default=(2, 10), metavar=('SMALL', 'LARGE'))
+        parser.add_argument('--only', default='',
+                            help='Проверять действия, содержащие подстроку')
+        parser.add_argument('--host', default='',
+                            help='Значение заголовка Host')
+
+    def handle(self, *args, **options):
+        small, large = sorted(options['page_sizes'])
+        if small < 1 or small == large:
+            raise CommandError(
+                '--page-sizes: два разных положительных размера')
+        self.host = options['host'] or settings.ALLOWED_HOSTS[0]
+        # Кеш ответов и корзины токенов исказили бы счёт запросов,
+        # картинки рецептов не должны остаться в MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            RESPONSE_CACHE_TTL=0, THROTTLE_BUCKETS={}, MEDIA_ROOT=media
+        ), keep_connections(), transaction.atomic():
+            failures = self.check_all(small, large, options['only'])
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                f'Превышен бюджет запросов: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены'))
+
+    def check_all(self, small, large, only):
+        self.seed(large)
+        self.handler = WSGIHandler()
+        failures = []
+        for name, scenarios in self.build_route_scenarios(small, large):
+            if only not in name:
+                continue
+            if name in SKIPPED:
+                self.stdout.write(f'{name}: пропущено, {SKIPPED[name]}')
+                continue
+            problems, report = self.check_action(name, scenarios)
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: {"; ".join(problems)}'))
+                self.stdout.write(report)
+        return failures
+
+    def seed(self, size):
+        """Пользователь с size подписками, рецептами в избранном
+        и корзине, size свободными рецептами для POST и своим
+        рецептом для PUT и PATCH; size ингредиентов"""
+        self.user = User.objects.create(
+            username=f'{SEED_PREFIX}-user',
+            email=f'{SEED_PREFIX}-user@example.com')
+        self.token = Token.objects.create(user=self.user).key
+        tags = list(Tag.objects.order_by('id')[:2])
+        for index in range(len(tags), 2):
+            tags.append(Tag.objects.create(
+                name=f'{SEED_PREFIX}-{index}',
+                color=f'#{0xB0D6E7 + index:06X}',
+                slug=f'{SEED_PREFIX}-{index}'))
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'{SEED_PREFIX}-{index}', measurement_unit='г')
+            for index in range(size)
+        ]
+        User.objects.bulk_create(
+            User(username=f'{SEED_PREFIX}-author-{index}',
+                 email=f'{SEED_PREFIX}-author-{index}@example.com')
+            for index in range(size + 1)
+        )
+        authors = list(User.objects.filter(
+            username__startswith=f'{SEED_PREFIX}-author-').order_by('id'))
+        recipes = [
+            Recipe.objects.create(
+                author=authors[index % len(authors)],
+                name=f'{SEED_PREFIX}-{index}',
+                image='recipes/images/fake.png',
+                text='Рецепт для проверки бюджета запросов',
+                cooking_time=10 + index,
+            )
+            for index in range(size * 2)
+        ]
+        self.own_recipe = Recipe.objects.create(
+            author=self.user,
+            name=f'{SEED_PREFIX}-own',
+            image='recipes/images/fake.png',
+            text='Рецепт для проверки бюджета запросов',
+            cooking_time=10,
+        )
+        recipes.append(self.own_recipe)
+        for recipe in recipes:
+            recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes for ingredient in ingredients
+        )
+        refresh_snapshots([recipe.pk for recipe in recipes])
+        bookmarked, self.free_recipes = recipes[:size], recipes[size:-1]
+        for model in (Favourite, Cart):
+            model.objects.bulk_create(
+                model(user=self.user, recipe=recipe) for recipe in bookmarked)
+        # Последний автор остаётся без подписки для subscribe
+        Follow.objects.bulk_create(
+            Follow(follower=self.user, following=author)
+            for author in authors[:-1])
+        self.free_author = authors[-1]
+        self.tags = tags
+        self.ingredients = ingredients
+        self.image = make_image()
+        self.tag = tags[0]
+        self.ingredient = ingredients[0]
+        self.job = Job.objects.create(
+            kind='shopping_list', user=self.user, status=Job.DONE)
+        self.job.result.save(
+            f'{SEED_PREFIX}.txt', ContentFile('Список покупок'.encode()))
+
+    def get_kwargs(self, basename, method):
+        if basename == 'recipes' and method in ('put', 'patch'):
+            return {'pk': self.own_recipe.pk}
+        return {'pk': {
+            'ingredients': self.ingredient.pk,
+            'jobs': self.job.pk,
+            'recipes': self.free_recipes[0].pk,
+            'tags': self.tag.pk,
+            'users': self.free_author.pk,
+        }[basename]}
+
+    def build_route_scenarios(self, small, large):
+        """Для каждого действия маршрутов router — пара сценариев
+        на малой и большой странице"""
+        for prefix, viewset, basename in router.registry:
+            for route in router.get_routes(viewset):
+                mapping = router.get_method_map(viewset, route.mapping)
+                route_name = route.name.format(basename=basename)
+                for method in mapping:
+                    kwargs = (self.get_kwargs(basename, method)
+                              if route.detail else {})
+                    path = reverse(route_name, kwargs=kwargs)
+                    name = (route_name if method == 'get'
+                            else f'{route_name}-{method}')
+                    yield name, [
+                        self.build_scenario(name, method, path, size)
+                        for size in (small, large)
+                    ]
+
+    def build_recipe(self, size):
+        """Тело создания и изменения рецепта с size ингредиентами"""
+        return {
+            'name': f'{SEED_PREFIX}-{size}',
+            'text': 'Рецепт для проверки бюджета запросов',
+            'cooking_time': 10,
+            'image': self.image,
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 1}
+                for ingredient in self.ingredients[:size]
+            ],
+        }
+
+    def build_scenario(self, name, method, path, size):
+        if method == 'get':
+            return Scenario(name, 'GET', path, {'limit': size}, True, None)
+        body = {}
+        if name in ('recipes-list-post', 'recipes-detail-put',
+                    'recipes-detail-patch'):
+            body = self.build_recipe(size)
+        elif name.startswith('recipes-') and '-bulk-' in name:
+            body = {'recipes': [
+                recipe.pk for recipe in self.free_recipes[:size]]}
+        return Scenario(name, method.upper(), path, {}, True,
+                        body if method == 'post' else body or None)
+
+    def prepare(self, scenario):
+        if scenario.method == 'DELETE':
+            self.request(scenario._replace(
+                method='POST', body=scenario.body or {}))
+
+    def restore(self, scenario):
+        # Созданные рецепты откатываются вместе с остальными данными
+        if scenario.method == 'POST' and scenario.name != (
+                'recipes-list-post'):
+            self.request(scenario._replace(
+                method='DELETE', body=scenario.body or None))
+
+    def record(self, scenario):
+        """Прогрев, затем замер одного запроса"""
+        recorder = QueryRecorder()
+        for capture in (False, True):
+            self.prepare(scenario)
+            if capture:
+                with recorder.capture():
+                    status, _ = self.request(scenario)
+            else:
+                self.request(scenario)
+            self.restore(scenario)
+        return status, recorder
+
+    def check_action(self, name, scenarios):
+        (small_status, small), (large_status, large) = [
+            self.record(scenario) for scenario in scenarios]
+        budget = QUERY_BUDGETS.get(name)
+        self.stdout.write(
+            f'{name}: {small.count}/{large.count} запросов, '
+            f'бюджет {budget}, статус {large_status}')
+        problems = []
+        if budget is None:
+            problems.append('бюджет не задан в api.query_budget')
+        elif large.count > budget:
+            problems.append(f'{large.count} > {budget}')
+        if large.count > small.count:
+            problems.append(
+                f'растёт с размером страницы: {small.count} -> '
+                f'{large.count}')
+        # Ответ с ошибкой не измеряет действие: 400 из-за Host
+        # или 404 проходят вообще без запросов
+        for status in (small_status, large_status):
+            if not 200 <= status < 300:
+                problems.append(f'статус {status}')
+                break
+        return problems, large.format_by_call_site()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = 'Выдаёт токен для заголовка X-Profile'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profile_token())
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+WARMUP_CODE = '''
+import time
+from foodgram.warmup import warm_up
+start = time.perf_counter()
+warm_up()
+print('warmup_ms', (time.perf_counter() - start) * 1000)
+'''
+
+
+def parse_importtime(output):
+    """Строки вывода python -X importtime -> [(модуль, self, cumulative)]
+    с временем в микросекундах"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = ('Запускает приложение в отдельном процессе с -X importtime '
+            'и показывает время импорта модулей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='foodgram.wsgi',
+                            help='Модуль, импорт которого измеряется')
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--sort', choices=('self', 'cumulative'),
+                            default='cumulative')
+        parser.add_argument('--by-package', action='store_true',
+                            help='Суммировать время по пакетам верхнего '
+                                 'уровня')
+        parser.add_argument('--warmup', action='store_true',
+                            help='Измерить также foodgram.warmup.warm_up')
+
+    def handle(self, *args, **options):
+        code = f'import {options["module"]}\n'
+        if options['warmup']:
+            code += WARMUP_CODE
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ,
+                     DJANGO_SETTINGS_MODULE=os.environ.get(
+                         'DJANGO_SETTINGS_MODULE', 'foodgram.settings')),
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        modules = parse_importtime(result.stderr)
+        total = sum(own for _, own, _ in modules)
+        if options['by_package']:
+            packages = defaultdict(int)
+            for name, own, _ in modules:
+                packages[name.split('.')[0]] += own
+            rows = sorted(packages.items(), key=lambda item: -item[1])
+            for name, own in rows[:options['limit']]:
+                self.stdout.write(
+                    f'{own / 1000:9.1f} ms {own / total:6.1%}  {name}')
+        else:
+            column = 1 if options['sort'] == 'self' else 2
+            rows = sorted(modules, key=lambda row: -row[column])
+            self.stdout.write(f'{"self":>9}    {"cumul":>9}')
+            for name, own, cumulative in rows[:options['limit']]:
+                self.stdout.write(
+                    f'{own / 1000:9.1f} ms {cumulative / 1000:9.1f} ms  '
+                    f'{name}')
+        self.stdout.write(
+            f'Модулей: {len(modules)}, импорт: {total / 1000:.1f} ms')
+        for line in result.stdout.splitlines():
+            if line.startswith('warmup_ms'):
+                self.stdout.write(
+                    f'Прогрев: {float(line.split()[1]):.1f} ms')
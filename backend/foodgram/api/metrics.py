@@ -0,0 +1,69 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+
+LABELS = ('view', 'method', 'status')
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_latency_seconds',
+    'Время обработки запроса',
+    LABELS,
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов за запрос',
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float('inf')),
+)
+REQUEST_DB_TIME = Histogram(
+    'foodgram_request_db_seconds',
+    'Суммарное время SQL-запросов за запрос',
+    LABELS,
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа',
+    LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float('inf')),
+)
+SLOW_QUERIES = Counter(
+    'foodgram_slow_queries',
+    'SQL-запросы дольше SLOW_QUERY_MS',
+    ('view',),
+)
+DB_CONNECTIONS_OPENED = Counter(
+    'foodgram_db_connections_opened',
+    'Новые подключения к базе данных',
+    ('alias',),
+)
+DB_CONNECTION_WAIT = Histogram(
+    'foodgram_db_connection_wait_seconds',
+    'Ожидание соединения из пула',
+    ('alias',),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5,
+             float('inf')),
+)
+DB_HEALTH_CHECK_FAILURES = Counter(
+    'foodgram_db_health_check_failures',
+    'Переиспользуемые соединения, не прошедшие проверку',
+    ('alias',),
+)
+
+
+def get_registry():
+    """В режиме нескольких воркеров gunicorn метрики собираются
+    из файлов в PROMETHEUS_MULTIPROC_DIR"""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,113 @@
+import cProfile
+import contextlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import (REQUEST_DB_TIME, REQUEST_LATENCY, REQUEST_QUERIES,
+                      RESPONSE_SIZE, SLOW_QUERIES)
+from .profiling import SqlRecorder, save_profile, should_profile
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_view_name(view_func, method):
+    """Имя view для меток: RecipeViewSet.list, UserViewSet.subscriptions"""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class QueryStats:
+    """Считает число и время SQL-запросов одного HTTP-запроса"""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                view = getattr(self.request, 'metrics_view', 'unresolved')
+                SLOW_QUERIES.labels(view).inc()
+                logger.warning('Медленный запрос %.1f ms в %s: %s',
+                               elapsed * 1000, view, sql)
+
+
+class MetricsMiddleware:
+    """Собирает задержку, число и время SQL-запросов и размер ответа
+    для каждого view и action"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(request)
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+        labels = (
+            getattr(request, 'metrics_view', 'unresolved'),
+            request.method,
+            response.status_code,
+        )
+        REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+        REQUEST_QUERIES.labels(*labels).observe(stats.count)
+        REQUEST_DB_TIME.labels(*labels).observe(stats.duration)
+        if response.streaming:
+            size = response.get('Content-Length')
+        else:
+            size = len(response.content)
+        if size is not None:
+            RESPONSE_SIZE.labels(*labels).observe(int(size))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(view_func, request.method)
+
+
+class ProfilingMiddleware:
+    """Профилирует долю запросов PROFILING_SAMPLE_RATE и запросы
+    с подписанным заголовком X-Profile"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        recorder = SqlRecorder()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        save_profile(
+            request,
+            getattr(request, 'metrics_view', 'unresolved'),
+            profiler,
+            recorder.queries,
+            time.perf_counter() - start,
+        )
+        return response
@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from .response_cache import (build_response, get_page_key, is_fresh, store,
+                             wait_for_entry)
+from foodgram.db_router import (get_replicas, is_sticky, mark_sticky,
+                                replica_reads)
+
+
+class AnonymousCacheMixin:
+    """Отдаёт гостям list и retrieve из кеша готовых ответов,
+    см. api.response_cache"""
+    anonymous_cache_actions = ('list', 'retrieve')
+
+    def is_anonymous_cacheable(self, request):
+        action_map = getattr(self, 'action_map', {})
+        return (
+            settings.RESPONSE_CACHE_TTL
+            and request.method == 'GET'
+            and action_map.get('get') in self.anonymous_cache_actions
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and 'format' not in request.GET
+            and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_anonymous_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        page_key = get_page_key(request)
+        entry = cache.get(page_key)
+        if entry is not None and is_fresh(entry):
+            return build_response(entry, 'HIT')
+        lock_key = f'{page_key}:lock'
+        if not cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK):
+            # Запись уже перестраивает другой запрос
+            if entry is None:
+                entry = wait_for_entry(page_key)
+            if entry is not None:
+                return build_response(
+                    entry, 'HIT' if is_fresh(entry) else 'STALE')
+            return super().dispatch(request, *args, **kwargs)
+        try:
+            created = time.time()
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'data'):
+                response.render()
+                store(page_key, request, response, created)
+                response['X-Cache'] = 'MISS'
+            return response
+        finally:
+            cache.delete(lock_key)
+
+
+class ReplicaReadMixin:
+    """Выполняет list и retrieve на реплике, если пользователь
+    недавно ничего не менял"""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (get_replicas()
+                and self.action in self.replica_actions
+                and not is_sticky(request.user)):
+            self.replica_context = replica_reads()
+            self.replica_context.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        context = getattr(self, 'replica_context', None)
+        if context is not None:
+            context.__exit__(None, None, None)
+            self.replica_context = None
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and get_replicas()
+                and request.user.is_authenticated):
+            mark_sticky(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,113 @@
+import json
+import os
+import pstats
+import random
+import re
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.html import format_html, format_html_join
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SIGNING_SALT = 'api.profiling'
+NAME_PATTERN = re.compile(r'^[\w.-]+\.(prof|json)$')
+
+
+def make_profile_token():
+    """Токен для заголовка X-Profile, действует PROFILING_TOKEN_MAX_AGE"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def should_profile(request):
+    token = request.META.get(PROFILE_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+                token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+            return True
+        except signing.BadSignature:
+            return False
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+class SqlRecorder:
+    """Запоминает SQL-запросы и их длительность"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def save_profile(request, view, profiler, queries, duration):
+    """Пишет профиль в PROFILING_DIR и удаляет самые старые файлы,
+    оставляя не больше PROFILING_MAX_FILES профилей"""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    stem = '{}-{}'.format(time.time_ns(), re.sub(r'[^\w.]', '_', view))
+    path = os.path.join(settings.PROFILING_DIR, stem)
+    profiler.dump_stats(path + '.prof')
+    summary = StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats(
+        'cumulative').print_stats(40)
+    with open(path + '.json', 'w', encoding='utf-8') as file:
+        json.dump({
+            'view': view,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'ms': round(duration * 1000, 3),
+            'queries': queries,
+            'stats': summary.getvalue(),
+        }, file, ensure_ascii=False, indent=2)
+    for name in list_profiles()[settings.PROFILING_MAX_FILES:]:
+        for extension in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(settings.PROFILING_DIR,
+                                       name + extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Имена профилей без расширения, новые первыми"""
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name[:-len('.json')] for name in names if name.endswith('.json')),
+        reverse=True,
+    )
+
+
+@staff_member_required
+def profile_list(request):
+    rows = format_html_join(
+        '\n',
+        '<li>{0} <a href="{0}.json">json</a> <a href="{0}.prof">prof</a>'
+        '</li>',
+        ((name,) for name in list_profiles()),
+    )
+    return HttpResponse(format_html('<ul>{}</ul>', rows))
+
+
+@staff_member_required
+def profile_download(request, name):
+    if not NAME_PATTERN.match(name):
+        raise Http404
+    path = os.path.join(settings.PROFILING_DIR, name)
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
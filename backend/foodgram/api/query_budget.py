@@ -0,0 +1,110 @@
+"""Бюджеты SQL-запросов для действий API, см. check_query_budget.
+
+Ключ — имя маршрута DefaultRouter, для методов кроме GET
+с суффиксом метода. Бюджет считается для авторизованного
+пользователя с прогретым кешем токенов; число запросов
+не должно зависеть от размера страницы
+"""
+import contextlib
+import os
+import traceback
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+
+# Списки и просмотр рецептов на сериализаторе DRF
+# (RECIPES_FLAT_SERIALIZER=False) делают на запрос больше
+QUERY_BUDGETS = {
+    'ingredients-list': 1,
+    'ingredients-detail': 1,
+    'jobs-list': 1,
+    'jobs-detail': 1,
+    'jobs-result': 1,
+    'recipes-list': 5,
+    'recipes-detail': 4,
+    # Теги тела проверяются по одному запросу на тег, ингредиенты —
+    # одним запросом; сохранение и ответ не зависят от их числа
+    'recipes-list-post': 18,
+    'recipes-detail-put': 20,
+    'recipes-detail-patch': 20,
+    'recipes-download-shopping-cart': 1,
+    'recipes-favorite-post': 3,
+    'recipes-favorite-delete': 2,
+    'recipes-shopping-cart-post': 3,
+    'recipes-shopping-cart-delete': 2,
+    'recipes-favorite-bulk-post': 4,
+    'recipes-favorite-bulk-delete': 2,
+    'recipes-shopping-cart-bulk-post': 4,
+    'recipes-shopping-cart-bulk-delete': 2,
+    'tags-list': 1,
+    'tags-detail': 1,
+    'users-list': 3,
+    'users-detail': 2,
+    'users-subscriptions': 4,
+    'users-subscribe-post': 4,
+    'users-subscribe-delete': 1,
+}
+
+# Действия, которые меняют учётные данные или удаляют данные
+# следующих прогонов, проверяются отдельно
+SKIPPED = {
+    'recipes-detail-delete': 'удаляет рецепт, нужный следующим прогонам',
+    'users-list-post': 'регистрация',
+    'users-set-password-post': 'смена пароля',
+    'users-detail-put': 'изменение учётных данных',
+    'users-detail-patch': 'изменение учётных данных',
+    'users-detail-delete': 'удаляет пользователя, нужного прогонам',
+}
+
+SQL_WIDTH = 160
+
+
+def get_call_site():
+    """Ближайший к запросу кадр кода проекта"""
+    here = os.path.abspath(__file__)
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(settings.BASE_DIR + os.sep)
+                and filename != here
+                and f'{os.sep}management{os.sep}' not in filename):
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{relative}:{frame.lineno} in {frame.name}'
+    return 'вне проекта'
+
+
+class QueryRecorder:
+    """Запоминает SQL и место вызова через connection.execute_wrapper"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, get_call_site()))
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @contextlib.contextmanager
+    def capture(self):
+        self.queries = []
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def format_by_call_site(self):
+        """Запросы, сгруппированные по месту вызова, частые сверху"""
+        groups = defaultdict(Counter)
+        for sql, call_site in self.queries:
+            groups[call_site][sql] += 1
+        lines = []
+        for call_site, statements in sorted(
+                groups.items(), key=lambda item: -sum(item[1].values())):
+            lines.append(f'  {call_site}: {sum(statements.values())}')
+            for sql, count in statements.most_common():
+                lines.append(f'    {count} x {sql[:SQL_WIDTH]}')
+        return '\n'.join(lines)
@@ -0,0 +1,124 @@
+"""Кеш готовых ответов для анонимных запросов.
+
+Для гостя ответ зависит только от адреса и параметров запроса,
+поэтому тело ответа кешируется целиком. Каждая запись помнит
+суррогатные ключи — рецепты, авторов и теги из ответа. Ключ хранит
+время последнего изменения объекта; запись действительна, пока все
+её ключи изменились раньше, чем она была построена.
+
+Устаревшую запись перестраивает один запрос, остальные в это
+время получают её же (stale-while-revalidate). Для согласованной
+инвалидации между воркерами нужен общий кеш (CACHE_BACKEND)
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+# Меняются при создании и удалении рецептов и правке справочников:
+# от них зависят все списки
+LIST_KEYS = ('recipes', 'ingredients')
+DETAIL_KEYS = ('ingredients',)
+# Ключи списков по параметрам запроса: порядок по популярности
+# меняется с избранным и корзиной. is_favorited и is_in_shopping_cart
+# для гостя ничего не фильтруют
+PARAM_KEYS = {
+    'ordering': 'scores',
+}
+
+WAIT_STEP = 0.05
+
+
+def get_page_key(request):
+    """Ключ не зависит от порядка параметров и значений"""
+    params = sorted(
+        (name, sorted(value for value in request.GET.getlist(name) if value))
+        for name in request.GET
+    )
+    url = (f'{request.scheme}://{request.get_host()}{request.path}?'
+           f'{urlencode(params, doseq=True)}')
+    return 'page:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def invalidate(*keys):
+    """Отмечает изменение после фиксации транзакции: запись,
+    построенная до неё по старым данным, будет отброшена"""
+    def mark():
+        now = time.time()
+        cache.set_many({f'sk:{key}': now for key in keys}, None)
+    transaction.on_commit(mark)
+
+
+def get_surrogate_keys(data, params):
+    """Рецепты, авторы и теги, попавшие в ответ, и ключи параметров
+    списка. None, если ответ без id рецептов (?fields=) и ключи
+    не определить"""
+    if isinstance(data, dict) and 'results' in data:
+        recipes, keys = data['results'], set(LIST_KEYS)
+        keys.update(key for param, key in PARAM_KEYS.items()
+                    if params.get(param))
+    else:
+        recipes, keys = [data], set(DETAIL_KEYS)
+    for recipe in recipes:
+        if 'id' not in recipe:
+            return None
+        keys.add(f'recipe:{recipe["id"]}')
+        if 'author' in recipe:
+            keys.add(f'author:{recipe["author"]["id"]}')
+        for tag in recipe.get('tags', ()):
+            keys.add(f'tag:{tag["id"]}')
+    return keys
+
+
+def is_valid(entry):
+    versions = cache.get_many([f'sk:{key}' for key in entry['keys']])
+    # Пропавший ключ означает неизвестное время изменения
+    return len(versions) == len(entry['keys']) and all(
+        changed < entry['created'] for changed in versions.values())
+
+
+def is_fresh(entry):
+    return (time.time() - entry['created'] < settings.RESPONSE_CACHE_TTL
+            and is_valid(entry))
+
+
+def store(page_key, request, response, created):
+    keys = get_surrogate_keys(response.data, request.GET)
+    if keys is None:
+        return
+    # Ключи без отметки считаются изменёнными до построения ответа
+    for key in keys:
+        cache.add(f'sk:{key}', created - 1, None)
+    cache.set(page_key, {
+        'created': created,
+        'keys': keys,
+        'status': response.status_code,
+        'content_type': response['Content-Type'],
+        'body': response.content,
+    }, settings.RESPONSE_CACHE_TTL + settings.RESPONSE_CACHE_STALE)
+
+
+def build_response(entry, state):
+    response = HttpResponse(
+        entry['body'],
+        status=entry['status'],
+        content_type=entry['content_type'],
+    )
+    response['X-Cache'] = state
+    return response
+
+
+def wait_for_entry(page_key):
+    """Ждёт, пока другой запрос построит отсутствующую запись"""
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(page_key)
+        if entry is not None:
+            return entry
+    return None
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .response_cache import invalidate
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipes_changed, scores_changed
+
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход из системы и удаление пользователя"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Смена пароля, деактивация и изменение профиля"""
+    if not created:
+        invalidate_user(instance)
+        invalidate(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, created=False, **kwargs):
+    """Изменение рецепта меняет его страницы, появление
+    и удаление — состав всех списков"""
+    update_fields = kwargs.get('update_fields') or ()
+    if (created or kwargs['signal'] is post_delete
+            or 'deleted_at' in update_fields):
+        invalidate('recipes', f'recipe:{instance.pk}')
+    else:
+        invalidate(f'recipe:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, pk_set, **kwargs):
+    """Теги рецепта меняют выдачу списков с фильтром по тегам.
+    Со стороны тега (tag.recipes.add) меняются рецепты из pk_set"""
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        invalidate('recipes', f'recipe:{instance.pk}')
+    else:
+        invalidate('recipes', f'tag:{instance.pk}',
+                   *[f'recipe:{pk}' for pk in pk_set or ()])
+
+
+@receiver(recipes_changed)
+def recipes_bulk_changed(sender, recipe_ids, **kwargs):
+    """Загрузка рецептов и пересборка снимков после правки
+    тега или ингредиента"""
+    invalidate('recipes', *[f'recipe:{pk}' for pk in recipe_ids])
+
+
+@receiver(scores_changed)
+def recipe_scores_changed(sender, recipe_ids, **kwargs):
+    """Избранное и корзина меняют порядок лент по популярности"""
+    invalidate('scores')
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate(f'recipe:{instance.recipe_id}')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Списки фильтруются по slug тега, поэтому меняются все"""
+    invalidate('recipes', f'tag:{instance.pk}')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate('ingredients')
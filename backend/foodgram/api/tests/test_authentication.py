@@ -0,0 +1,59 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from api import authentication
+from api.authentication import (CachedTokenAuthentication, LocalCache,
+                                get_cache_key, get_shared_cache)
+
+
+User = get_user_model()
+
+
+def other_worker():
+    """Память процесса другого воркера: своя, пустая"""
+    return mock.patch.object(
+        authentication, 'local_tokens', LocalCache(100, 5))
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        self.key = Token.objects.create(user=self.user).key
+        self.auth = CachedTokenAuthentication()
+
+    def revoke_elsewhere(self):
+        """Удаление токена в другом процессе: сигналы этого
+        процесса не срабатывают"""
+        Token.objects.filter(key=self.key)._raw_delete('default')
+
+    def test_local_memory_cache_is_not_shared(self):
+        with other_worker():
+            self.auth.authenticate_credentials(self.key)
+        self.assertIsNone(get_shared_cache())
+        self.revoke_elsewhere()
+        with other_worker(), self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_revoked_token_is_rejected_by_other_worker(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={'default': {
+                'BACKEND': ('django.core.cache.backends.filebased.'
+                            'FileBasedCache'),
+                'LOCATION': location,
+            }}
+        ):
+            with other_worker():
+                user, _ = self.auth.authenticate_credentials(self.key)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertIsNotNone(
+                get_shared_cache().get(get_cache_key(self.key)))
+            Token.objects.get(key=self.key).delete()
+            with other_worker(), self.assertRaises(AuthenticationFailed):
+                self.auth.authenticate_credentials(self.key)
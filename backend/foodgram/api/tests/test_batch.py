@@ -0,0 +1,39 @@
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from rest_framework.test import APITransactionTestCase
+
+
+@override_settings(BATCH_WORKERS=2)
+class BatchConnectionsTest(APITransactionTestCase):
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite в памяти не закрывает соединения')
+
+    def post_batch(self):
+        response = self.client.post('/api/batch/', {'requests': [
+            {'url': '/api/tags/'},
+            {'url': '/api/ingredients/'},
+            {'url': '/api/tags/'},
+            {'url': '/api/ingredients/'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.json()], [200] * 4)
+
+    def test_pool_threads_reuse_connections(self):
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count)
+        try:
+            self.post_batch()
+            self.assertLessEqual(len(opened), 2)
+            opened.clear()
+            self.post_batch()
+            self.assertEqual(opened, [])
+        finally:
+            connection_created.disconnect(count)
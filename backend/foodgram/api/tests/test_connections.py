@@ -0,0 +1,27 @@
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from api.connections import check_connections
+
+
+@override_settings(DB_HEALTH_CHECK_IDLE=30)
+class CheckConnectionsTest(TransactionTestCase):
+
+    def setUp(self):
+        connection.ensure_connection()
+
+    def test_recently_used_connection_not_checked(self):
+        connection.last_used = time.monotonic() - 5
+        with mock.patch.object(connection, 'is_usable') as is_usable:
+            check_connections()
+        is_usable.assert_not_called()
+
+    def test_idle_connection_checked(self):
+        connection.last_used = time.monotonic() - 31
+        with mock.patch.object(
+                connection, 'is_usable', return_value=True) as is_usable:
+            check_connections()
+        is_usable.assert_called_once_with()
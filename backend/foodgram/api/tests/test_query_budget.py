@@ -0,0 +1,17 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+
+class QueryBudgetTest(TestCase):
+
+    def test_budgets(self):
+        """Все действия API укладываются в api.query_budget"""
+        out = io.StringIO()
+        try:
+            call_command('check_query_budget', host='testserver',
+                         stdout=out)
+        except CommandError as error:
+            self.fail(f'{error}\n{out.getvalue()}')
+        self.assertIn('recipes-list-post: ', out.getvalue())
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from recipes.models import Recipe, Tag
+from recipes.snapshots import refresh_snapshots
+
+
+User = get_user_model()
+
+
+class ResponseCacheInvalidationTest(APITransactionTestCase):
+    """Инвалидация срабатывает после фиксации транзакции,
+    поэтому тесты идут без общей транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(
+            username='author', email='author@example.com')
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.recipes = []
+        for name in ('Каша', 'Омлет'):
+            recipe = Recipe.objects.create(
+                author=self.author, name=name, text='Приготовить',
+                image='recipes/images/dish.png', cooking_time=10)
+            recipe.tags.set([self.tag])
+            self.recipes.append(recipe)
+        refresh_snapshots([recipe.pk for recipe in self.recipes])
+
+    def get(self, params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache'], response.json()['results']
+
+    def test_popular_order_follows_favourites(self):
+        params = {'ordering': 'popular'}
+        state, results = self.get(params)
+        self.assertEqual(state, 'MISS')
+        self.assertEqual(self.get(params)[0], 'HIT')
+        reader = APIClient()
+        reader.force_authenticate(User.objects.create(
+            username='reader', email='reader@example.com'))
+        favourite = self.recipes[0] if results[0]['id'] != (
+            self.recipes[0].pk) else self.recipes[1]
+        response = reader.post(f'/api/recipes/{favourite.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        state, results = self.get(params)
+        self.assertEqual(state, 'MISS')
+        self.assertEqual(results[0]['id'], favourite.pk)
+
+    def test_tag_rename_reaches_cached_list(self):
+        params = {'tags': 'breakfast'}
+        self.get(params)
+        self.tag.name = 'Утро'
+        self.tag.save()
+        # Снимки пересобирает фоновая задача; до неё список старый
+        self.get(params)
+        self.assertEqual(self.get(params)[0], 'HIT')
+        refresh_snapshots([recipe.pk for recipe in self.recipes])
+        state, results = self.get(params)
+        self.assertEqual(state, 'MISS')
+        self.assertEqual(results[0]['tags'][0]['name'], 'Утро')
+
+    def test_tag_side_assignment(self):
+        params = {'tags': 'lunch'}
+        lunch = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch')
+        self.assertEqual(self.get(params)[1], [])
+        self.assertEqual(self.get(params)[0], 'HIT')
+        lunch.recipes.add(self.recipes[0])
+        state, results = self.get(params)
+        self.assertEqual(state, 'MISS')
+        self.assertEqual(len(results), 1)
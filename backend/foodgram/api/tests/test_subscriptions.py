@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.deletion import soft_delete_recipe
+from recipes.models import Follow, Recipe
+
+
+User = get_user_model()
+
+
+class SoftDeletedRecipesTest(APITestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create(
+            username='reader', email='reader@example.com')
+        self.author = User.objects.create(
+            username='author', email='author@example.com')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {index}',
+                image='recipes/images/dish.png', text='Приготовить',
+                cooking_time=10)
+            for index in range(3)
+        ]
+        soft_delete_recipe(self.recipes[0])
+        self.client.force_authenticate(self.reader)
+
+    def assert_alive_recipes(self, data):
+        self.assertEqual(data['recipes_count'], 2)
+        self.assertEqual(
+            sorted(recipe['id'] for recipe in data['recipes']),
+            [recipe.pk for recipe in self.recipes[1:]])
+
+    def test_subscribe(self):
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assert_alive_recipes(response.json())
+
+    def test_subscriptions(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_alive_recipes(response.json()['results'][0])
@@ -0,0 +1,47 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from api.throttling import TokenBucket
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_consumption(self):
+        """Потоки одного кеша не списывают больше ёмкости корзины"""
+        bucket = TokenBucket('throttle:test', capacity=10, rate=10 / 86400)
+        barrier = threading.Barrier(8)
+        allowed = []
+
+        def consume():
+            barrier.wait()
+            for _ in range(5):
+                if not bucket.consume():
+                    allowed.append(1)
+
+        threads = [threading.Thread(target=consume) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(allowed), 10)
+        self.assertGreater(bucket.consume(), 0)
+
+    def test_previous_window_refills_gradually(self):
+        """Токены прошлого окна возвращаются со скоростью пополнения"""
+        bucket = TokenBucket('throttle:test', capacity=10, rate=10 / 60)
+        with mock.patch('api.throttling.time.time', return_value=59.0):
+            for _ in range(10):
+                self.assertEqual(bucket.consume(), 0)
+            self.assertGreater(bucket.consume(), 0)
+        # Через 6,5 секунды вернулся один токен с лишним
+        with mock.patch('api.throttling.time.time', return_value=66.5):
+            self.assertEqual(bucket.consume(), 0)
+            self.assertAlmostEqual(bucket.consume(), 5.5)
+        with mock.patch('api.throttling.time.time', return_value=120.0):
+            self.assertEqual(bucket.consume(), 0)
@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (ёмкость 10, пополнение 10 / 60 токенов в секунду)"""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / DURATIONS[period[0]]
+
+
+def get_scope(request, view):
+    """Имя корзины: throttle_scope представления,
+    '<basename>.<action>' для viewset или имя маршрута"""
+    scope = getattr(view, 'throttle_scope', None)
+    if scope:
+        return scope
+    action = getattr(view, 'action', None)
+    basename = getattr(view, 'basename', None)
+    if action and basename:
+        return f'{basename}.{action}'
+    match = request.resolver_match
+    return match.url_name if match else None
+
+
+class TokenBucket:
+    """Корзина токенов на атомарных счётчиках кеша.
+
+    Запросы считаются cache.add + cache.incr в окне, за которое
+    пустая корзина наполняется целиком. Остаток корзины — ёмкость
+    минус запросы текущего окна и доля прошлого окна, которая
+    убывает с той же скоростью пополнения. Инкремент атомарен
+    в memcached из docker-compose и в LocMemCache, поэтому
+    одновременные запросы не проходят сверх ёмкости. С LocMemCache
+    у каждого процесса своя корзина и предел умножается на число
+    воркеров
+    """
+
+    def __init__(self, key, capacity, rate):
+        self.key = key
+        self.capacity = capacity
+        self.rate = rate
+        self.window = capacity / rate
+        # Счётчик нужен ещё одно окно после своего
+        self.timeout = int(self.window * 2) + 1
+
+    def increment(self, key, tokens):
+        if cache.add(key, tokens, self.timeout):
+            return tokens
+        try:
+            return cache.incr(key, tokens)
+        except ValueError:
+            # Счётчик истёк между add и incr
+            cache.add(key, tokens, self.timeout)
+            return tokens
+
+    def consume(self, tokens=1):
+        """Списывает токены. Возвращает 0 или сколько секунд ждать"""
+        index, offset = divmod(time.time(), self.window)
+        key = f'{self.key}:{int(index)}'
+        used = self.increment(key, tokens)
+        previous = cache.get(f'{self.key}:{int(index) - 1}', 0)
+        spent = previous * (1 - offset / self.window) + used
+        if spent <= self.capacity:
+            return 0
+        # Отказ не расходует корзину
+        try:
+            cache.decr(key, tokens)
+        except ValueError:
+            pass
+        return (spent - self.capacity) / self.rate
+
+
+class BucketThrottle(BaseThrottle):
+    """Ограничение частоты запросов по THROTTLE_BUCKETS.
+
+    Корзины задаются для имени корзины (см. get_scope) и вида
+    ключа: {'recipes.download_shopping_cart': {'user': '10/m'}}.
+    Запросы без настроенной корзины не ограничиваются
+    """
+    kind = None
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = None
+        scope = get_scope(request, view)
+        rate = settings.THROTTLE_BUCKETS.get(scope, {}).get(self.kind)
+        if rate is None:
+            return True
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        bucket = TokenBucket(
+            f'throttle:{scope}:{self.kind}:{ident}', capacity, refill)
+        self.delay = bucket.consume()
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(BucketThrottle):
+    """Корзина на пользователя; анонимные запросы пропускаются"""
+    kind = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPBucketThrottle(BucketThrottle):
+    """Корзина на адрес клиента с учётом NUM_PROXIES"""
+    kind = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
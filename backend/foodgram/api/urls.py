@@ -1,16 +1,19 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (BatchView, IngredientViewSet, JobViewSet, RecipeViewSet,
+                    TagViewSet, UserViewSet)
 
 
 router = DefaultRouter()
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
+router.register(r'jobs', JobViewSet, basename='jobs')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'users', UserViewSet, basename='users')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,29 +1,42 @@
 import io
+import os
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters import rest_framework as filters
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
+from .batch import BatchSerializer, run_batch
+from .facets import get_facets, get_requested_facets
 from .filters import IngredientFilter, RecipeFilter
+from .mixins import AnonymousCacheMixin, ReplicaReadMixin
 from .permissions import RecipePermission
+from jobs.models import Job
+from jobs.queue import enqueue
+from jobs.serializers import JobSerializer
+from recipes.flat import get_value_fields, serialize_recipes
 from recipes.models import (Cart, Favourite, Follow, Ingredient,
-                            Recipe, Tag)
-from recipes.serializers import (CartRecipeSerializer,
-                                 FavouriteRecipeSerializer,
+                            Recipe, RecipeIngredient, Tag)
+from recipes.serializers import (FavouriteCartRecipeSerializer,
                                  FollowSerializer,
                                  GetRecipeSerializer,
                                  IngredientSerializer,
-                                 RecipeSerializer, TagSerializer)
+                                 RecipeIdsSerializer,
+                                 RecipeSerializer, TagSerializer,
+                                 get_requested_fields)
+from recipes.deletion import soft_delete_recipe, soft_delete_user
+from recipes.scores import change_scores, remove_relations
+from recipes.shopping import build_shopping_list
 from users.serializers import (UserSerializer, UserSetPasswordSerializer,
                                UserSubscribedSerializer)
 
@@ -31,7 +44,7 @@ from users.serializers import (UserSerializer, UserSetPasswordSerializer,
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Viewset для ингредиентов"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -40,101 +53,270 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, ReplicaReadMixin,
+                    viewsets.ModelViewSet):
     """Viewset для рецептов"""
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.alive()
     serializer_class = RecipeSerializer
     permission_classes = (RecipePermission,)
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.alive()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = get_requested_fields(self.request.query_params)
+        user = self.request.user
+        if user.is_authenticated and 'is_favorited' in fields:
+            queryset = queryset.annotate(is_favorited=Exists(
+                Favourite.objects.filter(user=user, recipe=OuterRef('pk'))))
+        if user.is_authenticated and 'is_in_shopping_cart' in fields:
+            queryset = queryset.annotate(is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))))
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id')))
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient').order_by('id')
+            ))
+        return queryset.only('id', *[
+            name for name in ('author', 'name', 'image', 'text',
+                              'cooking_time')
+            if name in fields
+        ])
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return GetRecipeSerializer
         return RecipeSerializer
 
+    def get_flat_queryset(self):
+        """Строки рецептов для serialize_recipes"""
+        fields = get_requested_fields(self.request.query_params)
+        return self.filter_queryset(self.get_queryset()).select_related(
+            None).prefetch_related(None).values(
+            *get_value_fields(fields, self.request.user))
+
+    def serialize_flat(self, rows):
+        return serialize_recipes(
+            rows,
+            self.request,
+            get_requested_fields(self.request.query_params)
+        )
+
+    def list(self, request, *args, **kwargs):
+        """С параметром facets=tags,cooking_time в ответ добавляются
+        счётчики рецептов по тегам и времени приготовления"""
+        facets = get_requested_facets(request.query_params)
+        if settings.RECIPES_FLAT_SERIALIZER:
+            response = self.list_flat()
+        else:
+            response = super().list(request, *args, **kwargs)
+        if facets and isinstance(response.data, dict):
+            response.data['facets'] = get_facets(request, facets)
+        return response
+
+    def list_flat(self):
+        queryset = self.get_flat_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_flat(page))
+        return Response(self.serialize_flat(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPES_FLAT_SERIALIZER:
+            return super().retrieve(request, *args, **kwargs)
+        row = get_object_or_404(self.get_flat_queryset(), pk=kwargs['pk'])
+        return Response(self.serialize_flat([row])[0])
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        soft_delete_recipe(instance)
+
     @staticmethod
-    def add_remove_bookmark(request, model, serializer, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        method = request.parser_context['request'].method
-        if method == 'POST':
-            serializer = serializer(
-                recipe,
-                data=request.data,
-                context={'request': request}
+    def add_remove_bookmark(request, model, errors, pk):
+        """Один запрос на изменение связи; конфликт при одновременных
+        запросах разрешает уникальное ограничение в БД"""
+        if request.method == 'POST':
+            recipe = get_object_or_404(
+                Recipe.objects.alive().only(
+                    'id', 'name', 'image', 'cooking_time'),
+                pk=pk
             )
-            serializer.is_valid(raise_exception=True)
-            model.objects.create(user=request.user, recipe=recipe)
+            added_at = timezone.now()
+            if not model.objects.add(
+                user=request.user, recipe=recipe, added_at=added_at
+            ):
+                return Response({'error': errors['exists']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            change_scores(model, [(recipe.pk, added_at)])
+            serializer = FavouriteCartRecipeSerializer(
+                recipe, context={'request': request})
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED)
-        get_object_or_404(
-            model,
-            user=request.user,
-            recipe=recipe
-        ).delete()
+        if not remove_relations(model, model.objects.filter(
+            user=request.user, recipe_id=pk
+        )):
+            get_object_or_404(Recipe.objects.alive().only('id'), pk=pk)
+            return Response({'error': errors['missing']},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=[IsAuthenticated])
-    def favorite(self, request, *args, **kwargs):
+    def favorite(self, request, pk=None):
         """Добавляет и удаляет избранное"""
-        return self.add_remove_bookmark(request,
-                                        Favourite, 
-                                        FavouriteRecipeSerializer,
-                                        **kwargs
-               )
+        return self.add_remove_bookmark(
+            request,
+            Favourite,
+            {
+                'exists': 'Рецепт уже добавлен в избранное',
+                'missing': 'Рецепта нет в избранном',
+            },
+            pk
+        )
 
     @action(methods=['POST', 'DELETE'],
             detail=True, permission_classes=[IsAuthenticated])
-    def shopping_cart(self, request, *args, **kwargs):
+    def shopping_cart(self, request, pk=None):
         """Добавляет и удаляет покупки"""
-        return self.add_remove_bookmark(request,
-                                        Cart, 
-                                        CartRecipeSerializer,
-                                        **kwargs
-               )
+        return self.add_remove_bookmark(
+            request,
+            Cart,
+            {
+                'exists': 'Рецепт уже в корзине',
+                'missing': 'Рецепта нет в корзине',
+            },
+            pk
+        )
+
+    @staticmethod
+    def bulk_bookmark(request, model):
+        """Добавляет или удаляет несколько рецептов за один запрос.
+        DELETE без списка рецептов очищает всё"""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('recipes')
+        relations = model.objects.filter(user=request.user)
+        if request.method == 'DELETE':
+            if ids is None:
+                return Response(
+                    {'deleted': len(remove_relations(model, relations))})
+            existing = remove_relations(
+                model, relations.filter(recipe_id__in=ids))
+            return Response({'results': [
+                {'id': pk, 'status': 'deleted' if pk in existing
+                 else 'missing'}
+                for pk in ids
+            ]})
+        if not ids:
+            return Response({'recipes': ['Обязательное поле.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        found = set(Recipe.objects.alive().filter(
+            pk__in=ids).values_list('id', flat=True))
+        added_at = timezone.now()
+        # Как и одиночное добавление, счёт меняют только строки,
+        # вставленные этим запросом
+        added = model.objects.add_many(
+            'recipe_id', [pk for pk in dict.fromkeys(ids) if pk in found],
+            user=request.user, added_at=added_at)
+        change_scores(model, [(pk, added_at) for pk in added])
+        results = []
+        for pk in ids:
+            if pk not in found:
+                outcome = 'not_found'
+            elif pk in added:
+                outcome = 'added'
+            else:
+                outcome = 'exists'
+            results.append({'id': pk, 'status': outcome})
+        return Response({'results': results})
+
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='favorite',
+            url_name='favorite-bulk', permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        """Добавляет и удаляет несколько избранных рецептов"""
+        return self.bulk_bookmark(request, Favourite)
+
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_shopping_cart(self, request):
+        """Добавляет и удаляет несколько рецептов в покупках"""
+        return self.bulk_bookmark(request, Cart)
 
     @action(methods=['GET'], detail=False,
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request, *args, **kwargs):
-        """Формирует pdf-файл со списком покупок"""
-        buffer = io.BytesIO()
-        pdfmetrics.registerFont(TTFont('TimesNewRoman', 'timesnewroman.ttf'))
-        file = canvas.Canvas(buffer)
-        file.setFont('TimesNewRoman', 14)
-        file.drawString(200, 800,
-                        f'Список покупок пользователя {request.user.username}')
-        left = 50
-        bottom = 750
-        for unit in request.user.cart.values(
-            'recipe_id__ingredient__ingredient__name',
-            'recipe_id__ingredient__ingredient__measurement_unit',
-        ).annotate(Sum('recipe_id__ingredient__amount')):
-            name = unit['recipe_id__ingredient__ingredient__name']
-            measure = unit['recipe_id__ingredient__ingredient__measurement_unit']
-            amount = unit['recipe_id__ingredient__amount__sum']
-            file.drawString(left, bottom, f'{name} ({measure}) - {amount}')
-            bottom -= 20
-        file.showPage()
-        file.save()
-        buffer.seek(0)
+        """Формирует pdf-файл со списком покупок.
+        С параметром async=1 ставит задачу в очередь"""
+        if request.query_params.get('async') == '1':
+            job = enqueue('shopping_list', user=request.user)
+            serializer = JobSerializer(job, context={'request': request})
+            return Response(
+                serializer.data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse(
+                    'jobs-detail', args=[job.pk], request=request)}
+            )
         return FileResponse(
-            buffer, as_attachment=True, filename='recipe_list.pdf')
+            io.BytesIO(build_shopping_list(request.user)),
+            as_attachment=True,
+            filename='recipe_list.pdf'
+        )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Viewset для фоновых задач пользователя"""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = None
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(methods=['GET'], detail=True)
+    def result(self, request, *args, **kwargs):
+        """Отдаёт файл с результатом задачи"""
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result:
+            return Response({'error': 'Результат ещё не готов'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            job.result.open('rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.result.name)
+        )
+
+
+class BatchView(APIView):
+    """Несколько запросов к API за один вызов, см. api.batch"""
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            run_batch(request, serializer.validated_data['requests']))
+
+
+class TagViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Viewset для тегов"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Viewset для пользователей"""
-    queryset = User.objects.all()
+    queryset = User.objects.alive()
     serializer_class = UserSubscribedSerializer
 
     def get_serializer_class(self):
@@ -147,9 +329,13 @@ class UserViewSet(viewsets.ModelViewSet):
         pk = self.kwargs['pk']
         if pk == 'me':
             if user.is_authenticated:
-                return get_object_or_404(User, pk=user.pk)
+                self.check_object_permissions(self.request, user)
+                return user
             raise NotAuthenticated
-        return get_object_or_404(User, pk=pk)
+        return get_object_or_404(User.objects.alive(), pk=pk)
+
+    def perform_destroy(self, instance):
+        soft_delete_user(instance)
 
     @action(methods=['POST'], detail=False,
             permission_classes=[IsAuthenticated],
@@ -161,15 +347,29 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         user = request.user
         user.set_password(self.request.data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
         return Response({}, status=status.HTTP_201_CREATED)
 
+    @staticmethod
+    def with_recipes(queryset):
+        """Авторы для FollowSerializer: рецепты и их число
+        без удалённых"""
+        return queryset.annotate(recipes_count=Count(
+            'recipes', filter=Q(recipes__deleted_at=None), distinct=True
+        )).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.alive().only(
+                'id', 'name', 'image', 'cooking_time', 'author_id')
+        ))
+
     @action(methods=['GET'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request, *args, **kwargs):
         """Возвращает подписки"""
         user = request.user
-        queryset = User.objects.filter(followers__follower=user)
+        queryset = self.with_recipes(User.objects.alive().filter(
+            followers__follower=user
+        )).order_by('-id')
         page = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             page,
@@ -180,26 +380,34 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(methods=['POST', 'DELETE'],
             detail=True, permission_classes=[IsAuthenticated])
-    def subscribe(self, request, *args, **kwargs):
+    def subscribe(self, request, pk=None):
         """Добавляет и удаляет подписки"""
-        following = get_object_or_404(User, pk=kwargs['pk'])
-        method = request.parser_context['request'].method
-        if method == 'POST':
-            serializer = FollowSerializer(
-                following,
-                data=request.data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            Follow.objects.create(
+        if request.method == 'POST':
+            following = get_object_or_404(
+                self.with_recipes(User.objects.alive()), pk=pk)
+            if following == request.user:
+                return Response(
+                    {'error': 'Нельзя подписаться на самого себя'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not Follow.objects.add(
                 follower=request.user, following=following
-            )
+            ):
+                return Response(
+                    {'error': 'Вы уже подписаны на этого пользователя'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = FollowSerializer(
+                following, context={'request': request})
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED
             )
-        get_object_or_404(
-            Follow,
-            follower=request.user,
-            following=following
-        ).delete()
+        if not Follow.objects.remove(
+            follower=request.user, following_id=pk
+        ):
+            get_object_or_404(User.objects.alive().only('id'), pk=pk)
+            return Response(
+                {'error': 'Вы не подписаны на этого пользователя'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response({}, status=status.HTTP_204_NO_CONTENT)
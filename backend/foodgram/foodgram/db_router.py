@@ -0,0 +1,101 @@
+import contextlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+logger = logging.getLogger(__name__)
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaHealth:
+    """Помнит доступность реплик и перепроверяет их
+    не чаще раза в REPLICA_HEALTH_INTERVAL секунд"""
+
+    def __init__(self):
+        self.checked = {}
+        self.lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            healthy, checked_at = self.checked.get(alias, (True, None))
+            if (checked_at is not None
+                    and now - checked_at < settings.REPLICA_HEALTH_INTERVAL):
+                return healthy
+            self.checked[alias] = (healthy, now)
+        healthy = self.check(alias)
+        with self.lock:
+            self.checked[alias] = (healthy, now)
+        return healthy
+
+    @staticmethod
+    def check(alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            logger.warning('Реплика %s недоступна', alias, exc_info=True)
+            connections[alias].close()
+            return False
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    replicas = [alias for alias in get_replicas() if health.is_healthy(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+def get_sticky_key(user):
+    return f'db-sticky:{user.pk}'
+
+
+def mark_sticky(user):
+    """После записи пользователь читает с основной базы
+    REPLICA_STICKY_SECONDS секунд"""
+    cache.set(get_sticky_key(user), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user):
+    return user.is_authenticated and cache.get(get_sticky_key(user), False)
+
+
+@contextlib.contextmanager
+def replica_reads():
+    token = read_alias.set(choose_replica())
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Направляет чтения внутри replica_reads() на реплику,
+    всё остальное на основную базу"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
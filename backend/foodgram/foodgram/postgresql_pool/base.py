@@ -0,0 +1,146 @@
+"""PostgreSQL с пулом соединений в процессе.
+
+Нужен для потоковых воркеров gunicorn: соединение берётся из пула
+на время запроса и возвращается в него при close(), поэтому
+CONN_MAX_AGE должен быть 0. Настройки пула — ключ POOL базы:
+MIN_SIZE (сколько соединений открыть при создании пула), MAX_SIZE
+(предел открытых соединений; простаивающие держатся все, чтобы
+не переподключаться при обычной нагрузке) и TIMEOUT ожидания
+свободного соединения в секундах
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+from api.metrics import (DB_CONNECTION_WAIT, DB_CONNECTIONS_OPENED,
+                         DB_HEALTH_CHECK_FAILURES)
+
+
+Database = base.Database
+
+
+class CountingPool(ThreadedConnectionPool):
+    """Считает физические подключения к базе"""
+
+    def __init__(self, alias, *args, **kwargs):
+        self.alias = alias
+        super().__init__(*args, **kwargs)
+
+    def _connect(self, key=None):
+        DB_CONNECTIONS_OPENED.labels(self.alias).inc()
+        return super()._connect(key)
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool, который ждёт свободное соединение
+    вместо ошибки и проверяет соединения, простоявшие дольше
+    DB_HEALTH_CHECK_IDLE"""
+
+    def __init__(self, alias, conn_params, min_size, max_size, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.released_at = {}
+        self.pool = CountingPool(
+            alias, min_size, max_size, **conn_params)
+        # Пул закрывает возвращённые соединения сверх minconn,
+        # а открытых соединений не больше max_size
+        self.pool.minconn = max_size
+
+    def acquire(self):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(
+                f'Нет свободных соединений в пуле {self.alias}')
+        try:
+            connection = self.pool.getconn()
+            released_at = self.released_at.pop(id(connection), None)
+            if (released_at is not None
+                    and time.monotonic() - released_at
+                    >= settings.DB_HEALTH_CHECK_IDLE
+                    and not self.is_usable(connection)):
+                DB_HEALTH_CHECK_FAILURES.labels(self.alias).inc()
+                self.pool.putconn(connection, close=True)
+                connection = self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+        DB_CONNECTION_WAIT.labels(self.alias).observe(
+            time.perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        # Пул сам откатывает незавершённую транзакцию
+        # и закрывает сломанные соединения
+        self.pool.putconn(connection)
+        if not connection.closed:
+            self.released_at[id(connection)] = time.monotonic()
+        self.slots.release()
+
+    @staticmethod
+    def is_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def close(self):
+        self.pool.closeall()
+
+
+# Пулы привязаны к процессу: после fork воркер создаёт свои
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    with pools_lock:
+        pid, pool = pools.get(alias, (None, None))
+        if pid != os.getpid():
+            pool = ConnectionPool(
+                alias,
+                conn_params,
+                options.get('MIN_SIZE', 2),
+                options.get('MAX_SIZE', 10),
+                options.get('TIMEOUT', 5),
+            )
+            pools[alias] = (os.getpid(), pool)
+        return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pooled = True
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            self.alias, conn_params, self.settings_dict.get('POOL', {}))
+        connection = self.pool.acquire()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
+
+    def close_pool(self):
+        """Закрывает все соединения пула текущего процесса"""
+        self.close()
+        with pools_lock:
+            pid, pool = pools.pop(self.alias, (None, None))
+        if pid == os.getpid():
+            pool.close()
@@ -28,11 +28,14 @@ INSTALLED_APPS = [
     'djoser',
     'django_filters',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -44,6 +47,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Запросы к БД дольше порога пишутся в лог вместе с view
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', default='200'))
+
+# Профилирование запросов: доля случайных запросов и запросы с заголовком
+# X-Profile, подписанным командой make_profile_token
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default='0'))
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_DIR = os.getenv('PROFILING_DIR',
+                          default=os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', default='50'))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -71,15 +85,73 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        # Постоянные соединения вместо подключения на каждый запрос
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # Файл тестовой SQLite вместо базы в памяти: тесты
+        # параллельных запросов открывают несколько соединений
+        'TEST': {'NAME': os.getenv('DB_TEST_NAME')},
     }
 }
 
-#DATABASES = {                 # Используется для тестов
+# Пул соединений в процессе для воркеров gunicorn с --threads.
+# Соединения берут и потоки пакетных запросов: MAX_SIZE должен
+# покрывать --threads и BATCH_WORKERS
+if os.getenv('DB_POOL', default='False') == 'True':
+    DATABASES['default'].update(
+        ENGINE='foodgram.postgresql_pool',
+        CONN_MAX_AGE=0,
+        POOL={
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=2)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
+        },
+    )
+
+# Соединение, простоявшее дольше стольких секунд, проверяется
+# запросом SELECT 1 перед использованием. Базы и балансировщики
+# закрывают простаивающие соединения через минуты, поэтому
+# проверка на каждом запросе не нужна
+DB_HEALTH_CHECK_IDLE = int(os.getenv('DB_HEALTH_CHECK_IDLE', default=30))
+
+# Реплики для чтения: DB_REPLICAS=host1:5432,host2 для PostgreSQL
+# или пути к файлам для SQLite
+for index, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(','))
+):
+    replica_settings = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica_settings['ENGINE'].endswith('sqlite3'):
+        replica_settings['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        replica_settings['HOST'] = host
+        replica_settings['PORT'] = port or replica_settings['PORT']
+    DATABASES[f'replica{index}'] = replica_settings
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Чтение с основной базы после записи, секунды
+REPLICA_STICKY_SECONDS = 10
+
+REPLICA_HEALTH_INTERVAL = 30
+
+# DATABASES = {                 # Используется для тестов
 #    'default': {
 #        'ENGINE': 'django.db.backends.sqlite3',
 #        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
 #    }
-#}
+# }
+
+# Токены, корзины ограничений и кеш ответов должны быть общими
+# для воркеров: в docker-compose это memcached. LocMemCache
+# годится только для одного процесса
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,12 +197,76 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'api.authentication.CachedTokenAuthentication'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserBucketThrottle',
+        'api.throttling.IPBucketThrottle',
+    ],
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
     'PAGE_SIZE': 6,
 }
 
+# Корзины токенов: '<basename>.<action>' или имя маршрута -> вид ключа
+# -> 'количество/период'. Ёмкость корзины равна количеству
+THROTTLE_BUCKETS = {
+    'recipes.download_shopping_cart': {'user': '10/m', 'ip': '30/m'},
+    'recipes.create': {'user': '30/m'},
+    'recipes.bulk_favorite': {'user': '30/m'},
+    'recipes.bulk_shopping_cart': {'user': '30/m'},
+    'users.create': {'ip': '10/h'},
+    'users.set_password': {'user': '5/m', 'ip': '20/m'},
+    'login': {'ip': '20/m'},
+    'batch': {'user': '60/m', 'ip': '120/m'},
+}
+
+# Список и просмотр рецептов собираются из .values() без полей DRF
+RECIPES_FLAT_SERIALIZER = os.getenv(
+    'RECIPES_FLAT_SERIALIZER', default='True') == 'True'
+
+# Кеш ответов для гостей, секунды: свежесть записи, сколько ещё
+# отдавать устаревшую запись, пока её перестраивает другой запрос,
+# время жизни блокировки перестройки и ожидание чужой перестройки
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', default=30))
+RESPONSE_CACHE_STALE = 300
+RESPONSE_CACHE_LOCK = 10
+RESPONSE_CACHE_WAIT = 2
+
+# Пакетные запросы /api/batch/: число подзапросов, общее время
+# в секундах и потоки для параллельных GET
+BATCH_MAX_REQUESTS = 20
+BATCH_TIMEOUT = 10
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', default=4))
+
+# Рецептов в одной пачке при пересборке снимков ингредиентов и тегов
+SNAPSHOT_BATCH_SIZE = 500
+
+# Фоновое удаление помеченных пользователей и рецептов: строк
+# в пачке, пауза между пачками и время работы одной задачи, секунды
+PURGE_BATCH_SIZE = 1000
+PURGE_PAUSE = 0.1
+PURGE_MAX_SECONDS = 300
+
+# Время жизни фасетов списка рецептов в кеше, секунды
+FACETS_CACHE_TTL = 60
+
+# Фоновые задачи: 'database' — очередь в БД для run_jobs,
+# 'inline' — выполнение сразу в процессе запроса
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', default='database')
+JOBS_STALE_SECONDS = 3600
+# Завершённые задачи и их файлы удаляет run_jobs через сутки
+JOBS_RETENTION_SECONDS = 86400
+
+# Снимки пользователей по токену: в памяти воркера и в общем кеше
+AUTH_TOKEN_LOCAL_TTL = 5
+AUTH_TOKEN_LOCAL_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -1,8 +1,14 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
+from api.profiling import profile_download, profile_list
+
 
 urlpatterns = [
+    path('admin/profiles/', profile_list),
+    path('admin/profiles/<str:name>', profile_download),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view),
 ]
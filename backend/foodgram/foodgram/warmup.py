@@ -0,0 +1,52 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+from recipes.shopping import register_font
+
+
+logger = logging.getLogger(__name__)
+
+# Дешёвые запросы, которые проходят через маршрутизацию, фильтры,
+# сериализаторы и рендерер так же, как первые запросы пользователей
+WARMUP_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=а',
+    '/api/recipes/?limit=1',
+    '/api/recipes/?limit=1&view=card',
+)
+
+
+def warm_up():
+    """Заполняет ленивые кеши процесса: маршруты, метаданные моделей,
+    фильтры и сериализаторы, переводы, шрифт для списка покупок.
+
+    Вызывается в мастере gunicorn при preload_app, тогда результат
+    наследуют все воркеры, или в каждом воркере до приёма запросов
+    """
+    start = time.perf_counter()
+    try:
+        register_font()
+        factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        for path in WARMUP_PATHS:
+            match = resolve(path.split('?')[0])
+            match.func(
+                factory.get(path), *match.args, **match.kwargs
+            ).render()
+    except Exception:
+        logger.exception('Ошибка прогрева')
+    logger.info('Прогрев занял %.1f ms',
+                (time.perf_counter() - start) * 1000)
+
+
+def connect():
+    """Открывает соединения со всеми базами до первого запроса"""
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except Exception:
+            logger.exception('Не удалось подключиться к %s', alias)
@@ -0,0 +1,48 @@
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+
+# Приложение импортируется и прогревается в мастере один раз,
+# воркеры получают готовые модули и кеши при fork
+preload_app = os.getenv('GUNICORN_PRELOAD', default='True') == 'True'
+
+
+def on_starting(server):
+    """Очищает файлы метрик от предыдущего запуска"""
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in glob.glob(os.path.join(path, '*.db')):
+            os.remove(name)
+
+
+def child_exit(server, worker):
+    """Удаляет файлы метрик завершившегося воркера"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    """Прогревает приложение в мастере при preload_app"""
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        from foodgram.warmup import warm_up
+
+        warm_up()
+        # Соединения мастера не должны достаться воркерам
+        for connection in connections.all():
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    """Завершает прогрев воркера до приёма запросов"""
+    from foodgram.warmup import connect, warm_up
+
+    if not worker.cfg.preload_app:
+        warm_up()
+    connect()
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'kind', 'user', 'status', 'created', 'finished_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('error',)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,114 @@
+import logging
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.models import Job
+from jobs.queue import (claim, delete_expired, mark_failed, requeue_stale,
+                        run_job)
+
+
+logger = logging.getLogger('jobs.queue')
+
+
+def execute(pk):
+    """Выполняется в дочернем процессе со своим соединением с БД"""
+    try:
+        return run_job(pk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда очередь опустеет')
+        parser.add_argument('--cleanup-interval', type=float,
+                            default=3600,
+                            help='Как часто удалять старые задачи, '
+                                 'секунды; 0 — не удалять')
+        parser.add_argument('--requeue-interval', type=float,
+                            default=60,
+                            help='Как часто возвращать в очередь задачи '
+                                 'упавших воркеров, секунды')
+
+    def handle(self, *args, **options):
+        # Задача -> её future; по ним же requeue_stale
+        # не трогает задачи, которые выполняет этот воркер
+        self.running = {}
+        self.pool = ProcessPoolExecutor(options['processes'])
+        try:
+            self.loop(options)
+        finally:
+            self.pool.shutdown()
+
+    def loop(self, options):
+        requeue_at = cleanup_at = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= requeue_at:
+                requeued = requeue_stale(exclude=self.running.values())
+                if requeued:
+                    self.stdout.write(f'Возвращено в очередь: {requeued}')
+                requeue_at = now + options['requeue_interval']
+            interval = options['cleanup_interval']
+            if interval and now >= cleanup_at:
+                deleted = delete_expired()
+                if deleted:
+                    self.stdout.write(f'Удалено старых задач: {deleted}')
+                cleanup_at = now + interval
+            free = options['processes'] - len(self.running)
+            ids = claim(free) if free else []
+            # Дочерние процессы не должны наследовать открытые соединения
+            connections.close_all()
+            for pk in ids:
+                self.running[self.pool.submit(execute, pk)] = pk
+            if not self.running:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+            done, _ = wait(
+                self.running,
+                timeout=options['poll_interval'],
+                return_when=FIRST_COMPLETED
+            )
+            self.collect(done, options['processes'])
+
+    def collect(self, done, processes):
+        """Записывает итог завершённых задач. Исключение future не
+        останавливает цикл: задача отмечается упавшей, а сломанный
+        пул процессов пересоздаётся"""
+        broken = False
+        for future in done:
+            broken = self.finish(future) or broken
+        if broken:
+            # Остальные задачи сломанного пула завершаются той же ошибкой
+            rest, _ = wait(self.running)
+            for future in rest:
+                self.finish(future)
+            self.pool.shutdown(wait=False)
+            self.pool = ProcessPoolExecutor(processes)
+            self.stdout.write('Пул процессов пересоздан')
+
+    def finish(self, future):
+        """Возвращает True, если упал процесс пула"""
+        pk = self.running.pop(future)
+        try:
+            status = future.result()
+        except Exception as error:
+            logger.error('Задача #%s не выполнена', pk, exc_info=error)
+            mark_failed(pk, ''.join(traceback.format_exception(
+                type(error), error, error.__traceback__)))
+            self.stdout.write(f'Задача #{pk} завершена: {Job.FAILED}')
+            return isinstance(error, BrokenProcessPool)
+        self.stdout.write(f'Задача #{pk} завершена: {status}')
+        return False
@@ -0,0 +1,80 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import models
+
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField(
+        max_length=100,
+        verbose_name='Тип задачи'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Владелец'
+    )
+    payload = models.TextField(
+        default='{}',
+        verbose_name='Параметры в JSON'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name='Статус'
+    )
+    result = models.FileField(
+        upload_to='jobs/',
+        blank=True,
+        verbose_name='Результат'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Начало выполнения'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Окончание выполнения'
+    )
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk}'
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['status', 'created'],
+                         name='job_queue_idx'),
+        ]
@@ -0,0 +1,111 @@
+import json
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+
+def register(kind):
+    """Регистрирует обработчик задачи. Обработчик получает Job и может
+    вернуть пару (расширение файла, байты) — она сохраняется в result"""
+    def decorator(func):
+        handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, user=None, **payload):
+    """Ставит задачу в очередь. При JOBS_BACKEND = 'inline'
+    задача выполняется сразу в текущем процессе"""
+    if kind not in handlers:
+        raise KeyError(f'Неизвестный тип задачи: {kind}')
+    job = Job.objects.create(
+        kind=kind, user=user, payload=json.dumps(payload))
+    if settings.JOBS_BACKEND == 'inline':
+        run_job(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def claim(limit):
+    """Забирает до limit задач из очереди и помечает их выполняемыми"""
+    with transaction.atomic():
+        queryset = Job.objects.filter(status=Job.QUEUED).order_by('created')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list('id', flat=True)[:limit])
+        Job.objects.filter(pk__in=ids).update(
+            status=Job.RUNNING, started_at=timezone.now())
+    return ids
+
+
+def requeue_stale(exclude=()):
+    """Возвращает в очередь задачи, чей воркер завершился аварийно;
+    exclude — задачи, которые ещё выполняет вызывающий воркер"""
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_STALE_SECONDS),
+    ).exclude(pk__in=list(exclude)).update(status=Job.QUEUED, started_at=None)
+
+
+def mark_failed(pk, error):
+    """Отмечает упавшей задачу, которую не завершил run_job,
+    например из-за падения процесса пула"""
+    return Job.objects.filter(pk=pk, status=Job.RUNNING).update(
+        status=Job.FAILED, error=error, finished_at=timezone.now())
+
+
+def delete_expired(batch_size=500):
+    """Удаляет завершённые задачи старше JOBS_RETENTION_SECONDS
+    вместе с файлами результатов"""
+    border = timezone.now() - timedelta(
+        seconds=settings.JOBS_RETENTION_SECONDS)
+    queryset = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED), finished_at__lt=border)
+    deleted = 0
+    while True:
+        jobs = list(queryset.only('id', 'result')[:batch_size])
+        if not jobs:
+            return deleted
+        for job in jobs:
+            if job.result:
+                job.result.delete(save=False)
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        deleted += len(jobs)
+
+
+def run_job(pk):
+    job = Job.objects.get(pk=pk)
+    if job.started_at is None:
+        job.started_at = timezone.now()
+    try:
+        result = handlers[job.kind](job)
+    except Exception:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        job.status = Job.FAILED
+        job.error = traceback.format_exc()
+    else:
+        if result is not None:
+            extension, content = result
+            job.result.save(
+                f'{uuid.uuid4().hex}.{extension}',
+                ContentFile(content),
+                save=False
+            )
+        job.status = Job.DONE
+    job.finished_at = timezone.now()
+    job.save()
+    return job.status
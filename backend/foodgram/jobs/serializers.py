@@ -0,0 +1,28 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from .models import Job
+
+
+FAILED_MESSAGE = 'Задача завершилась с ошибкой'
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор состояния фоновой задачи. Трассировка ошибки
+    видна только в логах воркера и в админке"""
+    result = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'status', 'error', 'result',
+                  'created', 'finished_at')
+
+    def get_error(self, obj):
+        return FAILED_MESSAGE if obj.status == Job.FAILED else ''
+
+    def get_result(self, obj):
+        if obj.status != Job.DONE or not obj.result:
+            return None
+        return reverse('jobs-result', args=[obj.pk],
+                       request=self.context.get('request'))
@@ -0,0 +1,98 @@
+import io
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.management.commands.run_jobs import Command as RunJobsCommand
+from jobs.models import Job
+from jobs.queue import delete_expired, requeue_stale
+from jobs.serializers import FAILED_MESSAGE, JobSerializer
+
+
+class DeleteExpiredTest(TestCase):
+
+    def test_deletes_old_finished_jobs_and_files(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media):
+            old = timezone.now() - timedelta(days=2)
+            expired = Job.objects.create(
+                kind='shopping_list', status=Job.DONE, finished_at=old)
+            expired.result.save('list.pdf', ContentFile(b'%PDF'))
+            path = expired.result.path
+            failed = Job.objects.create(
+                kind='shopping_list', status=Job.FAILED, finished_at=old)
+            fresh = Job.objects.create(
+                kind='shopping_list', status=Job.DONE,
+                finished_at=timezone.now())
+            queued = Job.objects.create(kind='shopping_list')
+
+            self.assertEqual(delete_expired(batch_size=1), 2)
+
+            self.assertFalse(os.path.exists(path))
+            self.assertQuerysetEqual(
+                Job.objects.order_by('pk'), [fresh.pk, queued.pk],
+                transform=lambda job: job.pk)
+            self.assertFalse(Job.objects.filter(pk=failed.pk).exists())
+
+
+class RequeueStaleTest(TestCase):
+
+    def test_skips_jobs_of_current_worker(self):
+        old = timezone.now() - timedelta(days=1)
+        own, stale = [
+            Job.objects.create(kind='shopping_list', status=Job.RUNNING,
+                               started_at=old)
+            for _ in range(2)
+        ]
+
+        self.assertEqual(requeue_stale(exclude=[own.pk]), 1)
+
+        own.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual(own.status, Job.RUNNING)
+        self.assertEqual(stale.status, Job.QUEUED)
+
+
+class CollectTest(TestCase):
+
+    def test_broken_pool_fails_jobs_and_restarts_pool(self):
+        """Падение процесса пула отмечает задачи упавшими
+        и не останавливает цикл воркера"""
+        jobs = [
+            Job.objects.create(kind='shopping_list', status=Job.RUNNING,
+                               started_at=timezone.now())
+            for _ in range(2)
+        ]
+        futures = [Future() for _ in jobs]
+        for future in futures:
+            future.set_exception(BrokenProcessPool('процесс завершился'))
+        command = RunJobsCommand(stdout=io.StringIO())
+        command.running = {
+            future: job.pk for future, job in zip(futures, jobs)}
+        old_pool = command.pool = ProcessPoolExecutor(1)
+
+        command.collect({futures[0]}, 1)
+
+        self.assertEqual(command.running, {})
+        self.assertIsNot(command.pool, old_pool)
+        command.pool.shutdown()
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.FAILED)
+            self.assertIn('BrokenProcessPool', job.error)
+
+
+class JobSerializerTest(TestCase):
+
+    def test_error_hides_traceback(self):
+        job = Job.objects.create(
+            kind='shopping_list', status=Job.FAILED,
+            error='Traceback (most recent call last):\n  File "/app/x.py"')
+
+        self.assertEqual(JobSerializer(job).data['error'], FAILED_MESSAGE)
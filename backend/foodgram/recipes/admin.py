@@ -1,36 +1,131 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.lookups import IsNull
+from django.utils.functional import cached_property
 
+from .deletion import soft_delete_recipe
 from .models import Cart, Favourite, Follow, Ingredient, Recipe, Tag
+from .snapshots import refresh_snapshots
+
+
+def is_alive_filter(node):
+    """Условие deleted_at IS NULL из alive()"""
+    target = getattr(getattr(node, 'lhs', None), 'target', None)
+    return (isinstance(node, IsNull) and node.rhs is True
+            and target is not None and target.name == 'deleted_at')
+
+
+def is_unfiltered(queryset):
+    """Без условий, кроме alive(): помеченных к удалению строк
+    единицы, и оценка по статистике остаётся верной"""
+    where = queryset.query.where
+    return not where.negated and all(
+        is_alive_filter(child) for child in where.children)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для больших таблиц без фильтров берёт число строк из статистики
+    PostgreSQL вместо COUNT(*)"""
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and is_unfiltered(queryset):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row is not None and row[0] >= self.threshold:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class SoftDeleteAdmin(admin.ModelAdmin):
+    """Удаление через recipes.deletion: страница подтверждения
+    не перебирает каскад, помеченные объекты скрыты"""
+    soft_delete = None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).alive()
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.soft_delete(obj)
 
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
-    search_fields = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(SoftDeleteAdmin, LargeTableAdmin):
     list_display = ('name', 'author', 'favorites')
-    list_filter = ('author', 'name', 'tags__name')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username')
+    autocomplete_fields = ('author', 'tags')
+    soft_delete = staticmethod(soft_delete_recipe)
+
+    def get_queryset(self, request):
+        favorites = Favourite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(count=Count('*')).values(
+            'count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Subquery(favorites, output_field=IntegerField()))
 
     def favorites(self, obj):
-        return len(obj.users.all())
+        return obj.favorites_count or 0
+
+    favorites.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_snapshots([form.instance.pk])
 
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
+    search_fields = ('name', 'slug')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'follower', 'following')
+    list_select_related = ('follower', 'following')
+    search_fields = ('^follower__username', '^following__username')
+    autocomplete_fields = ('follower', 'following')
 
 
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
-class FavouriteAdmin(admin.ModelAdmin):
+class FavouriteAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 admin.site.register(Ingredient, IngredientAdmin)
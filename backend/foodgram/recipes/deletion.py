@@ -0,0 +1,162 @@
+"""Отложенное удаление пользователей и рецептов.
+
+Каскад по избранному, корзинам, подпискам и ингредиентам популярного
+рецепта или активного автора затрагивает сотни тысяч строк. Поэтому
+удаление только помечает объект (deleted_at), и он сразу пропадает
+из API, а задача purge_deleted удаляет связи пачками по
+PURGE_BATCH_SIZE строк с паузой PURGE_PAUSE между ними, затем картинки
+и сами объекты
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import (Cart, Favourite, Follow, Recipe, RecipeIngredient,
+                     RecipeScore)
+from .scores import remove_relations
+from jobs.models import Job
+from jobs.queue import enqueue
+
+
+User = get_user_model()
+RecipeTag = Recipe.tags.through
+
+PURGE_JOB = 'purge_deleted'
+
+
+def schedule_purge():
+    """Ставит задачу после фиксации транзакции, если её ещё нет
+    в очереди: одна задача удаляет всё помеченное"""
+    def schedule():
+        if not Job.objects.filter(
+                kind=PURGE_JOB, status=Job.QUEUED).exists():
+            enqueue(PURGE_JOB)
+    transaction.on_commit(schedule)
+
+
+@transaction.atomic
+def soft_delete_recipe(recipe):
+    recipe.deleted_at = timezone.now()
+    recipe.save(update_fields=['deleted_at'])
+    schedule_purge()
+
+
+@transaction.atomic
+def soft_delete_user(user):
+    """Помечает пользователя и его рецепты, отзывает токены"""
+    now = timezone.now()
+    user.deleted_at = now
+    user.is_active = False
+    user.save(update_fields=['deleted_at', 'is_active'])
+    Recipe.objects.filter(author=user, deleted_at=None).update(deleted_at=now)
+    for token in Token.objects.filter(user=user):
+        token.delete()
+    schedule_purge()
+
+
+def pending(queryset):
+    """Помеченные объекты по одному: строки удаляются по ходу обхода,
+    поэтому курсор на всю выборку не держится"""
+    last_id = 0
+    while True:
+        obj = queryset.filter(
+            deleted_at__isnull=False, pk__gt=last_id).order_by('pk').first()
+        if obj is None:
+            return
+        # delete() обнуляет pk объекта
+        last_id = obj.pk
+        yield obj
+
+
+class Purger:
+    """Удаляет помеченные объекты, пока не выйдет время max_seconds.
+    Возвращает из run() False, если работа осталась"""
+
+    def __init__(self, batch_size, pause, max_seconds):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.deadline = time.monotonic() + max_seconds
+        self.deleted = 0
+
+    def out_of_time(self):
+        return time.monotonic() >= self.deadline
+
+    def delete_batches(self, queryset, delete=None):
+        """Удаляет строки queryset пачками. delete(model, queryset)
+        заменяет обычное удаление пачки"""
+        model = queryset.model
+        while not self.out_of_time():
+            ids = list(queryset.order_by().values_list(
+                'pk', flat=True)[:self.batch_size])
+            if not ids:
+                return True
+            batch = model.objects.filter(pk__in=ids)
+            if delete is None:
+                batch.delete()
+            else:
+                delete(model, batch)
+            self.deleted += len(ids)
+            time.sleep(self.pause)
+        return False
+
+    def purge_recipe(self, recipe):
+        for queryset in (
+            Favourite.objects.filter(recipe=recipe),
+            Cart.objects.filter(recipe=recipe),
+            RecipeIngredient.objects.filter(recipe=recipe),
+            RecipeTag.objects.filter(recipe=recipe),
+        ):
+            if not self.delete_batches(queryset):
+                return False
+        RecipeScore.objects.filter(recipe=recipe).delete()
+        image = recipe.image.name
+        recipe.delete()
+        # Одну картинку могут делить рецепты из генератора и импорта
+        if image and not Recipe.objects.filter(image=image).exists():
+            default_storage.delete(image)
+        self.deleted += 1
+        return True
+
+    def purge_user(self, user):
+        for recipe in pending(Recipe.objects.filter(author=user)):
+            if not self.purge_recipe(recipe):
+                return False
+        # Избранное и корзина пользователя уменьшают счёт чужих рецептов
+        for queryset, delete in (
+            (Favourite.objects.filter(user=user), remove_relations),
+            (Cart.objects.filter(user=user), remove_relations),
+            (Follow.objects.filter(follower=user), None),
+            (Follow.objects.filter(following=user), None),
+        ):
+            if not self.delete_batches(queryset, delete):
+                return False
+        for job in Job.objects.filter(user=user).exclude(result=''):
+            job.result.delete(save=False)
+        user.delete()
+        self.deleted += 1
+        return True
+
+    def run(self):
+        for recipe in pending(Recipe.objects.all()):
+            if not self.purge_recipe(recipe):
+                return False
+        for user in pending(User.objects.all()):
+            if not self.purge_user(user):
+                return False
+        return True
+
+
+def purge_deleted():
+    """Удаляет помеченные объекты в пределах PURGE_MAX_SECONDS.
+    Если работа осталась, ставит продолжение в очередь"""
+    purger = Purger(settings.PURGE_BATCH_SIZE, settings.PURGE_PAUSE,
+                    settings.PURGE_MAX_SECONDS)
+    if not purger.run():
+        transaction.on_commit(partial(enqueue, PURGE_JOB))
+    return purger.deleted
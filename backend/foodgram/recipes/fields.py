@@ -1,12 +1,44 @@
+import binascii
 from base64 import b64decode
-from django.core.files.base import ContentFile
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework import serializers
 
 
+# Кратно 4, чтобы каждый кусок base64 декодировался отдельно
+CHUNK_SIZE = 64 * 1024
+
+
 class Base64ImageField(serializers.ImageField):
+    """Принимает картинку строкой data:image/<ext>;base64,...
+    или обычным файлом из multipart/form-data"""
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(b64decode(imgstr), name='image.'+ext)
+            try:
+                data = self.decode(data)
+            except (binascii.Error, ValueError):
+                self.fail('invalid_image')
         return super().to_internal_value(data)
+
+    @staticmethod
+    def decode(data):
+        """Декодирует base64 по частям во временный файл на диске,
+        не держа в памяти вторую копию картинки. Переносы строк
+        и пробелы убираются в каждой части, а остаток неполной
+        четвёрки символов переходит в следующую"""
+        format, imgstr = data.split(';base64,')
+        ext = format.split('/')[-1]
+        file = TemporaryUploadedFile(
+            'image.' + ext, 'image/' + ext, 0, None)
+        rest = ''
+        for start in range(0, len(imgstr), CHUNK_SIZE):
+            chunk = rest + ''.join(imgstr[start:start + CHUNK_SIZE].split())
+            end = len(chunk) - len(chunk) % 4
+            file.write(b64decode(chunk[:end], validate=True))
+            rest = chunk[end:]
+        if rest:
+            raise binascii.Error('Длина base64 не кратна четырём')
+        file.size = file.tell()
+        file.seek(0)
+        return file
@@ -0,0 +1,101 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from .models import Follow
+from .serializers import GetRecipeSerializer
+from .snapshots import get_ingredients, get_tags
+
+
+User = get_user_model()
+
+RECIPE_COLUMNS = ('name', 'image', 'text', 'cooking_time')
+USER_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+# Поле ответа -> (колонка снимка, чтение из связанных таблиц)
+SNAPSHOTS = {
+    'tags': ('tags_snapshot', get_tags),
+    'ingredients': ('ingredients_snapshot', get_ingredients),
+}
+
+
+def load_snapshots(rows, name):
+    """Списки поля name из снимков; рецепты без снимка
+    читаются из связанных таблиц"""
+    column, fallback = SNAPSHOTS[name]
+    values = {}
+    missing = []
+    for row in rows:
+        if row[column]:
+            values[row['id']] = json.loads(row[column])
+        else:
+            missing.append(row['id'])
+    if missing:
+        values.update(fallback(missing))
+        values.update((pk, []) for pk in missing if pk not in values)
+    return values
+
+
+def get_authors(author_ids, user):
+    following = set()
+    if user.is_authenticated:
+        following = set(Follow.objects.filter(
+            follower=user, following_id__in=author_ids
+        ).values_list('following_id', flat=True))
+    authors = {}
+    for row in User.objects.filter(pk__in=author_ids).values(*USER_FIELDS):
+        row['is_subscribed'] = row['id'] in following
+        authors[row['id']] = row
+    return authors
+
+
+def get_value_fields(fields, user):
+    """Аргументы для queryset.values() под набор полей ответа"""
+    values = ['id']
+    if 'author' in fields:
+        values.append('author_id')
+    values += [name for name in RECIPE_COLUMNS if name in fields]
+    values += [column for name, (column, _) in SNAPSHOTS.items()
+               if name in fields]
+    if user.is_authenticated:
+        values += [name for name in ('is_favorited', 'is_in_shopping_cart')
+                   if name in fields]
+    return values
+
+
+def serialize_recipes(rows, request, fields=GetRecipeSerializer.Meta.fields):
+    """Собирает рецепты в формате GetRecipeSerializer без полей DRF.
+
+    rows: словари из queryset.values(*get_value_fields(fields, user))
+    с аннотациями is_favorited и is_in_shopping_cart
+    для авторизованного пользователя
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    if not recipe_ids:
+        return []
+    if 'tags' in fields:
+        tags = load_snapshots(rows, 'tags')
+    if 'ingredients' in fields:
+        ingredients = load_snapshots(rows, 'ingredients')
+    if 'author' in fields:
+        authors = get_authors(
+            {row['author_id'] for row in rows}, request.user)
+    getters = {
+        'id': lambda row: row['id'],
+        'tags': lambda row: tags[row['id']],
+        'author': lambda row: authors[row['author_id']],
+        'ingredients': lambda row: ingredients[row['id']],
+        'is_favorited': lambda row: row.get('is_favorited', False),
+        'is_in_shopping_cart': (
+            lambda row: row.get('is_in_shopping_cart', False)),
+        'name': lambda row: row['name'],
+        'image': lambda row: (
+            request.build_absolute_uri(default_storage.url(row['image']))
+            if row['image'] else None),
+        'text': lambda row: row['text'],
+        'cooking_time': lambda row: row['cooking_time'],
+    }
+    selected = [(name, getters[name]) for name in fields]
+    return [{name: getter(row) for name, getter in selected} for row in rows]
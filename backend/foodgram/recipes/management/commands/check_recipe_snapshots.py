@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.snapshots import find_mismatches, refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = ('Сверяет снимки ингредиентов и тегов рецептов со связанными '
+            'таблицами; с --fix пересобирает расходящиеся')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Сколько id расходящихся рецептов вывести')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        start = time.perf_counter()
+        mismatches = []
+        fixed = 0
+        pending = []
+        for pk in find_mismatches(options['batch_size']):
+            mismatches.append(pk)
+            if options['fix']:
+                pending.append(pk)
+                if len(pending) >= options['batch_size']:
+                    fixed += refresh_snapshots(pending)
+                    pending = []
+        if pending:
+            fixed += refresh_snapshots(pending)
+        elapsed = time.perf_counter() - start
+        if mismatches:
+            shown = ', '.join(map(str, mismatches[:options['show']]))
+            self.stdout.write(f'Расходятся: {len(mismatches)} ({shown})')
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено: {fixed}, {elapsed:.1f} s'))
+            return
+        if mismatches:
+            raise CommandError('Снимки рецептов расходятся с таблицами')
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимки согласованы, {elapsed:.1f} s'))
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.snapshots import get_ingredients, get_tags
+
+
+RECIPES_FILE = 'recipes.jsonl'
+IMAGES_DIR = 'images'
+HASH_CHUNK_SIZE = 64 * 1024
+
+FIELDS = ('pk', 'author__username', 'name', 'text', 'cooking_time',
+          'pub_date', 'image', 'tags_snapshot', 'ingredients_snapshot')
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты с ингредиентами, тегами и картинками '
+            'в каталог: recipes.jsonl и images/<sha256>')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Каталог выгрузки')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--author', action='append', default=[],
+                            help='Только рецепты автора, можно повторять')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+        self.output = options['output']
+        os.makedirs(os.path.join(self.output, IMAGES_DIR), exist_ok=True)
+        path = os.path.join(self.output, RECIPES_FILE)
+        if os.path.exists(path):
+            raise CommandError(f'{path} уже существует')
+        queryset = Recipe.objects.alive().order_by('pk')
+        if options['author']:
+            queryset = queryset.filter(
+                author__username__in=options['author'])
+        # Кеш хешей держит память постоянной, а общая картинка
+        # многих рецептов читается один раз
+        self.export_image = lru_cache(maxsize=1024)(self.copy_image)
+        start = time.perf_counter()
+        exported = 0
+        with open(path, 'w', encoding='utf-8') as output:
+            rows = queryset.values_list(*FIELDS).iterator(
+                chunk_size=options['chunk_size'])
+            for row in rows:
+                output.write(json.dumps(
+                    self.serialize(*row), ensure_ascii=False) + '\n')
+                exported += 1
+                if exported % options['chunk_size'] == 0:
+                    self.stdout.write(f'Рецептов: {exported}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}, '
+            f'{time.perf_counter() - start:.1f} s'))
+
+    def serialize(self, pk, author, name, text, cooking_time, pub_date,
+                  image, tags_snapshot, ingredients_snapshot):
+        """Рецепт со связями по естественным ключам: автор по username,
+        теги по slug, ингредиенты по названию и единице измерения"""
+        tags = (json.loads(tags_snapshot) if tags_snapshot
+                else get_tags([pk])[pk])
+        ingredients = (json.loads(ingredients_snapshot)
+                       if ingredients_snapshot
+                       else get_ingredients([pk])[pk])
+        return {
+            'author': author,
+            'name': name,
+            'text': text,
+            'cooking_time': cooking_time,
+            'pub_date': pub_date.isoformat(),
+            'image': self.export_image(image) if image else None,
+            'tags': [
+                {key: tag[key] for key in ('name', 'color', 'slug')}
+                for tag in tags
+            ],
+            'ingredients': [
+                {key: item[key]
+                 for key in ('name', 'measurement_unit', 'amount')}
+                for item in ingredients
+            ],
+        }
+
+    def copy_image(self, name):
+        """Копирует картинку в images/ под именем sha256 содержимого.
+        Возвращает путь относительно каталога выгрузки"""
+        digest = hashlib.sha256()
+        try:
+            image = default_storage.open(name, 'rb')
+        except OSError:
+            self.stderr.write(f'Нет файла картинки {name}')
+            return None
+        with image:
+            for chunk in image.chunks(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+            extension = os.path.splitext(name)[1].lower()
+            relative = f'{IMAGES_DIR}/{digest.hexdigest()}{extension}'
+            target = os.path.join(self.output, relative)
+            if not os.path.exists(target):
+                image.seek(0)
+                with open(f'{target}.tmp', 'wb') as copy:
+                    for chunk in image.chunks(HASH_CHUNK_SIZE):
+                        copy.write(chunk)
+                os.replace(f'{target}.tmp', target)
+        return relative
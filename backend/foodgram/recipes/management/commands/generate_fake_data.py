@@ -0,0 +1,272 @@
+import bisect
+import csv
+import io
+import itertools
+import os
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (Cart, Favourite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.scores import refresh_scores
+from recipes.snapshots import refresh_all
+
+
+User = get_user_model()
+
+FAKE_PASSWORD = 'foodgram'
+FAKE_IMAGE = 'recipes/images/fake.png'
+# Добавления в избранное и корзину растянуты на этот срок
+BOOKMARK_PERIOD = timedelta(days=60)
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B5651D', 'bakery'),
+    ('Суп', '#2D9CDB', 'soup'),
+    ('Салат', '#27AE60', 'salad'),
+    ('Напиток', '#EB5757', 'drink'),
+)
+DISHES = (
+    'Запеканка', 'Суп', 'Салат', 'Рагу', 'Пирог', 'Омлет', 'Паста',
+    'Каша', 'Смузи', 'Котлеты', 'Плов', 'Блины', 'Рулет', 'Жаркое',
+)
+
+
+def chunked(iterable, size):
+    """Разбивает поток объектов на списки не длиннее size"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ZipfSampler:
+    """Выбирает элементы с вероятностью, убывающей по закону Ципфа"""
+
+    def __init__(self, population, exponent, rng):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+        self.rng = rng
+
+    def choice(self):
+        index = bisect.bisect(self.cum_weights, self.rng.random() * self.total)
+        return self.population[min(index, len(self.population) - 1)]
+
+    def sample(self, size):
+        """Возвращает до size различных элементов"""
+        size = min(size, len(self.population))
+        result = set()
+        for _ in range(size * 4):
+            result.add(self.choice())
+            if len(result) >= size:
+                break
+        return result
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу данных сгенерированными пользователями, '
+            'рецептами, подписками, избранным и покупками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--favourites', type=int, default=20,
+                            help='Среднее число избранных рецептов')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения Ципфа')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        self.rng = random.Random(options['seed'])
+        self.zipf = options['zipf']
+        self.batch_size = options['batch_size']
+        ingredient_ids = self.load_ingredients()
+        tag_ids = self.load_tags()
+        self.ensure_image()
+        user_ids = self.create_users(options['users'])
+        if not user_ids:
+            user_ids = list(User.objects.values_list('id', flat=True))
+        if not user_ids:
+            raise CommandError('Нет пользователей для авторства рецептов')
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, ingredient_ids)
+        self.create_follows(user_ids, options['follows'])
+        self.create_bookmarks(
+            Favourite, user_ids, recipe_ids, options['favourites'])
+        self.create_bookmarks(Cart, user_ids, recipe_ids, options['cart'])
+        self.reset_sequences()
+        refresh_scores(self.batch_size)
+        refresh_all(
+            Recipe.objects.filter(ingredients_snapshot=''), self.batch_size)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы'))
+
+    def load_ingredients(self):
+        """Загружает справочник ингредиентов из ingredients.csv"""
+        if not Ingredient.objects.exists():
+            path = os.path.join(settings.BASE_DIR, 'ingredients.csv')
+            with open(path, encoding='utf-8') as file:
+                rows = (Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in csv.reader(file))
+                for chunk in chunked(rows, self.batch_size):
+                    Ingredient.objects.bulk_create(chunk)
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+    def load_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def ensure_image(self):
+        """Сохраняет общую картинку для всех сгенерированных рецептов"""
+        if default_storage.exists(FAKE_IMAGE):
+            return
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1), (255, 255, 255)).save(buffer, 'PNG')
+        default_storage.save(FAKE_IMAGE, buffer)
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+    def create_users(self, count):
+        start = self.next_id(User)
+        password = make_password(FAKE_PASSWORD, salt='generatefakedata')
+        users = (
+            User(
+                id=pk,
+                username=f'fake{pk}',
+                email=f'fake{pk}@example.com',
+                first_name=f'Имя{pk}',
+                last_name=f'Фамилия{pk}',
+                password=password,
+            ) for pk in range(start, start + count)
+        )
+        for chunk in chunked(users, self.batch_size):
+            User.objects.bulk_create(chunk)
+        self.stdout.write(f'Пользователей: {count}')
+        return list(range(start, start + count))
+
+    def generate_recipes(self, count, start, authors, tags, ingredients):
+        for pk in range(start, start + count):
+            ingredient_ids = ingredients.sample(self.rng.randint(3, 12))
+            recipe = Recipe(
+                id=pk,
+                author_id=authors.choice(),
+                name=f'{self.rng.choice(DISHES)} №{pk}',
+                image=FAKE_IMAGE,
+                text=f'Описание рецепта №{pk}',
+                cooking_time=self.rng.randint(1, 180),
+            )
+            recipe_tags = [
+                Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+                for tag_id in sorted(tags.sample(self.rng.randint(1, 3)))
+            ]
+            recipe_ingredients = [
+                RecipeIngredient(
+                    recipe_id=pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                ) for ingredient_id in sorted(ingredient_ids)
+            ]
+            yield recipe, recipe_tags, recipe_ingredients
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids):
+        start = self.next_id(Recipe)
+        rows = self.generate_recipes(
+            count,
+            start,
+            ZipfSampler(user_ids, self.zipf, self.rng),
+            ZipfSampler(tag_ids, self.zipf, self.rng),
+            ZipfSampler(ingredient_ids, self.zipf, self.rng),
+        )
+        created = 0
+        for chunk in chunked(rows, self.batch_size):
+            with transaction.atomic():
+                Recipe.objects.bulk_create(row[0] for row in chunk)
+                Recipe.tags.through.objects.bulk_create(
+                    itertools.chain.from_iterable(row[1] for row in chunk))
+                RecipeIngredient.objects.bulk_create(
+                    itertools.chain.from_iterable(row[2] for row in chunk))
+            created += len(chunk)
+            self.stdout.write(f'Рецептов: {created}/{count}')
+        return list(range(start, start + count))
+
+    def generate_follows(self, user_ids, average):
+        authors = ZipfSampler(user_ids, self.zipf, self.rng)
+        for follower_id in user_ids:
+            for following_id in sorted(
+                authors.sample(self.rng.randint(0, 2 * average))
+            ):
+                if following_id != follower_id:
+                    yield Follow(
+                        follower_id=follower_id, following_id=following_id)
+
+    def create_follows(self, user_ids, average):
+        for chunk in chunked(
+            self.generate_follows(user_ids, average), self.batch_size
+        ):
+            Follow.objects.bulk_create(chunk, ignore_conflicts=True)
+        self.stdout.write('Подписки созданы')
+
+    def generate_bookmarks(self, model, user_ids, recipe_ids, average):
+        recipes = ZipfSampler(recipe_ids, self.zipf, self.rng)
+        now = timezone.now()
+        for user_id in user_ids:
+            for recipe_id in sorted(
+                recipes.sample(self.rng.randint(0, 2 * average))
+            ):
+                yield model(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    added_at=now - self.rng.random() * BOOKMARK_PERIOD
+                )
+
+    def create_bookmarks(self, model, user_ids, recipe_ids, average):
+        if not recipe_ids:
+            return
+        for chunk in chunked(
+            self.generate_bookmarks(model, user_ids, recipe_ids, average),
+            self.batch_size
+        ):
+            model.objects.bulk_create(chunk, ignore_conflicts=True)
+        self.stdout.write(f'{model.__name__}: готово')
+
+    @staticmethod
+    def reset_sequences():
+        """Сдвигает последовательности id после вставки с явными ключами"""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
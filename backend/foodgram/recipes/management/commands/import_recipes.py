@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .export_recipes import RECIPES_FILE
+from recipes.models import (ImportProgress, Ingredient, Recipe,
+                            RecipeIngredient, RecipeScore, Tag)
+from recipes.signals import recipes_changed
+from recipes.snapshots import build_snapshots
+
+
+User = get_user_model()
+RecipeTag = Recipe.tags.through
+
+IMAGE_UPLOAD_TO = Recipe._meta.get_field('image').upload_to
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из каталога export_recipes. Прерванная '
+            'загрузка продолжается с последней сохранённой пачки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Каталог выгрузки')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--default-author',
+                            help='Автор рецептов, чьих авторов нет в базе')
+        parser.add_argument('--checkpoint',
+                            help='Имя прогресса в базе, по умолчанию '
+                                 'абсолютный путь к recipes.jsonl')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать заново, забыв прогресс')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        self.input = options['input']
+        path = os.path.join(self.input, RECIPES_FILE)
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла {path}')
+        self.checkpoint = (options['checkpoint']
+                           or os.path.abspath(path))
+        self.default_author = None
+        if options['default_author']:
+            try:
+                self.default_author = User.objects.get(
+                    username=options['default_author']).pk
+            except User.DoesNotExist:
+                raise CommandError(
+                    f'Нет пользователя {options["default_author"]}')
+        self.authors = {}
+        self.tags = {tag.slug: tag for tag in Tag.objects.all()}
+        self.colors = {tag.color for tag in self.tags.values()}
+        self.ingredients = {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.all()
+        }
+        if options['restart']:
+            ImportProgress.objects.filter(source=self.checkpoint).delete()
+        offset, imported = self.load()
+        if offset:
+            self.stdout.write(f'Продолжение с рецепта {imported + 1}')
+        start = time.perf_counter()
+        with open(path, 'rb') as source:
+            source.seek(offset)
+            while True:
+                batch = []
+                for line in source:
+                    if line.strip():
+                        batch.append(json.loads(line))
+                    if len(batch) >= options['batch_size']:
+                        break
+                if not batch:
+                    break
+                self.new_images = []
+                try:
+                    with transaction.atomic():
+                        self.import_batch(batch)
+                        self.save(source.tell(), imported + len(batch))
+                except BaseException:
+                    self.discard_images()
+                    raise
+                imported += len(batch)
+                self.stdout.write(f'Рецептов: {imported}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported}, '
+            f'{time.perf_counter() - start:.1f} s'))
+
+    def load(self):
+        progress = ImportProgress.objects.filter(
+            source=self.checkpoint).first()
+        if progress is None:
+            return 0, 0
+        return progress.offset, progress.imported
+
+    def save(self, offset, imported):
+        """Прогресс пишется в транзакции пачки: пачка и отметка
+        о ней фиксируются или откатываются вместе"""
+        ImportProgress.objects.update_or_create(
+            source=self.checkpoint,
+            defaults={'offset': offset, 'imported': imported})
+
+    def get_authors(self, usernames):
+        missing = set(usernames) - set(self.authors)
+        if missing:
+            self.authors.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+        unknown = set(usernames) - set(self.authors)
+        if unknown and self.default_author is None:
+            raise CommandError(
+                f'Нет авторов: {", ".join(sorted(unknown))}. '
+                f'Укажите --default-author')
+        return {name: self.authors.get(name, self.default_author)
+                for name in usernames}
+
+    def get_tag(self, data):
+        """Теги сопоставляются по slug. Цвет тега уникален, поэтому
+        новый тег с занятым цветом получает свободный цвет"""
+        tag = self.tags.get(data['slug'])
+        if tag is None:
+            tag = Tag.objects.create(
+                name=data['name'], slug=data['slug'],
+                color=self.get_color(data['color'].upper(), data['slug']))
+            self.tags[tag.slug] = tag
+            self.colors.add(tag.color)
+        return tag
+
+    def get_color(self, color, slug):
+        if color not in self.colors:
+            return color
+        value = int(hashlib.md5(slug.encode()).hexdigest()[:6], 16)
+        while f'#{value:06X}' in self.colors:
+            value = (value + 1) % 0x1000000
+        return f'#{value:06X}'
+
+    def get_ingredient(self, data):
+        key = (data['name'], data['measurement_unit'])
+        ingredient = self.ingredients.get(key)
+        if ingredient is None:
+            ingredient = Ingredient.objects.create(
+                name=data['name'], measurement_unit=data['measurement_unit'])
+            self.ingredients[key] = ingredient
+        return ingredient
+
+    def get_image(self, relative):
+        """Картинки хранятся под хешем содержимого, поэтому
+        одинаковые файлы сохраняются один раз"""
+        if not relative:
+            return ''
+        name = IMAGE_UPLOAD_TO + os.path.basename(relative)
+        if not default_storage.exists(name):
+            with open(os.path.join(self.input, relative), 'rb') as image:
+                name = default_storage.save(name, image)
+            self.new_images.append(name)
+        return name
+
+    def discard_images(self):
+        """Файлы не откатываются с транзакцией: картинки, впервые
+        сохранённые откатившейся пачкой, удаляются"""
+        for name in self.new_images:
+            default_storage.delete(name)
+
+    def import_batch(self, batch):
+        authors = self.get_authors({item['author'] for item in batch})
+        recipes = []
+        relations = []
+        for item in batch:
+            tags = [self.get_tag(tag) for tag in item['tags']]
+            ingredients = [
+                (self.get_ingredient(data), data['amount'])
+                for data in item['ingredients']
+            ]
+            recipes.append(Recipe(
+                author_id=authors[item['author']],
+                name=item['name'],
+                text=item['text'],
+                cooking_time=item['cooking_time'],
+                image=self.get_image(item['image']),
+                **build_snapshots(tags, ingredients)
+            ))
+            relations.append((tags, ingredients))
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        # pub_date с auto_now_add, исходная дата ставится отдельно
+        for recipe, item in zip(recipes, batch):
+            recipe.pub_date = parse_datetime(item['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe, (tags, _) in zip(recipes, relations)
+            for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ingredient.pk,
+                amount=amount)
+            for recipe, (_, ingredients) in zip(recipes, relations)
+            for ingredient, amount in ingredients
+        )
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=recipe.pk) for recipe in recipes],
+            ignore_conflicts=True
+        )
+        recipes_changed.send(
+            sender=Recipe, recipe_ids=[recipe.pk for recipe in recipes])
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.scores import refresh_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов по избранному '
+            'и корзинам и создаёт недостающие строки счёта')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        done = refresh_scores(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов: {done}, {time.perf_counter() - start:.1f} s'))
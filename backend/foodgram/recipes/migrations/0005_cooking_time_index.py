@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveIntegerField(db_index=True, verbose_name='Время приготовления'),
+        ),
+    ]
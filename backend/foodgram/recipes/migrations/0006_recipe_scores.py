@@ -0,0 +1,80 @@
+# Generated by Django 2.2.19 on 2026-10-19 09:00
+
+import datetime
+import math
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Параметры recipes.scores на момент миграции: модуль с тех пор
+# изменился, а миграция должна давать тот же результат
+EPOCH = datetime.datetime(2022, 12, 1, tzinfo=datetime.timezone.utc)
+HALFLIFE = datetime.timedelta(days=7)
+WEIGHTS = {'Favourite': 1.0, 'Cart': 0.5}
+
+
+def get_trending(popular, growth):
+    """log2(1 + popular * 2 ** growth) без возведения
+    в большую степень"""
+    if not popular:
+        return 0.0
+    return growth + math.log2(popular + 2 ** -growth)
+
+
+def create_scores(apps, schema_editor):
+    """Счёт для существующих рецептов. Все связи получают
+    added_at = время миграции, поэтому
+    trending = log2(1 + popular * 2 ** growth)"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    growth = (django.utils.timezone.now() - EPOCH) / HALFLIFE
+    popular = dict.fromkeys(Recipe.objects.values_list('pk', flat=True), 0)
+    for name, weight in WEIGHTS.items():
+        counts = apps.get_model('recipes', name).objects.values(
+            'recipe_id').annotate(count=models.Count('pk'))
+        for row in counts:
+            popular[row['recipe_id']] += weight * row['count']
+    RecipeScore.objects.bulk_create(
+        [RecipeScore(recipe_id=pk, popular=value,
+                     trending=get_trending(value, growth))
+         for pk, value in popular.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_cooking_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('popular', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Популярность с затуханием')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Добавлен в корзину'),
+        ),
+        migrations.AddField(
+            model_name='favourite',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Добавлен в избранное'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['popular', 'recipe'], name='score_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['trending', 'recipe'], name='score_trending_idx'),
+        ),
+        migrations.RunPython(create_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-19 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_snapshot',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Снимок ингредиентов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_snapshot',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Снимок тегов'),
+        ),
+    ]
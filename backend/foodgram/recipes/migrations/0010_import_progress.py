@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-19 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True, verbose_name='Файл выгрузки')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Смещение в файле')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Загружено рецептов')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+            ],
+        ),
+    ]
@@ -1,11 +1,88 @@
+import sqlite3
+
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connections, models, router
+from django.utils import timezone
 
 
 User = get_user_model()
 
 
+def can_return_rows(connection):
+    """Поддерживает ли БД RETURNING в INSERT и DELETE"""
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite'
+        and sqlite3.sqlite_version_info >= (3, 35))
+
+
+class UniqueRelationManager(models.Manager):
+    """Менеджер связей с уникальной парой ключей: добавление и удаление
+    одним запросом без гонок между проверкой и записью"""
+
+    def with_defaults(self, fields):
+        for field in self.model._meta.concrete_fields:
+            if (field.name not in fields and not field.primary_key
+                    and field.has_default()):
+                fields[field.name] = field.get_default()
+        return fields
+
+    def build_insert(self, connection, names, count):
+        """INSERT count строк, пропускающий уже существующие"""
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(opts.get_field(name).column) for name in names)
+        placeholders = ', '.join(
+            [f'({", ".join(["%s"] * len(names))})'] * count)
+        if connection.vendor == 'mysql':
+            statement, conflict = 'INSERT IGNORE INTO', ''
+        else:
+            statement, conflict = 'INSERT INTO', ' ON CONFLICT DO NOTHING'
+        return (f'{statement} {quote(opts.db_table)} ({columns}) '
+                f'VALUES {placeholders}{conflict}')
+
+    def add(self, **fields):
+        """Возвращает False, если такая связь уже существует"""
+        fields = self.with_defaults(fields)
+        connection = connections[router.db_for_write(self.model)]
+        sql = self.build_insert(connection, fields, 1)
+        with connection.cursor() as cursor:
+            params = [getattr(value, 'pk', value)
+                      for value in fields.values()]
+            cursor.execute(sql, params)
+            return cursor.rowcount == 1
+
+    def add_many(self, key, values, **fields):
+        """Добавляет связи fields с каждым значением поля key.
+        Возвращает значения, чьи связи вставил именно этот запрос:
+        строки, которые успел вставить параллельный запрос, в них
+        не попадают"""
+        values = list(values)
+        connection = connections[router.db_for_write(self.model)]
+        if not values:
+            return set()
+        if not can_return_rows(connection):
+            return {value for value in values
+                    if self.add(**fields, **{key: value})}
+        fields = self.with_defaults(dict(fields, **{key: None}))
+        params = []
+        for value in values:
+            fields[key] = value
+            params += [getattr(field, 'pk', field)
+                       for field in fields.values()]
+        column = self.model._meta.get_field(key).column
+        sql = (self.build_insert(connection, fields, len(values))
+               + f' RETURNING {connection.ops.quote_name(column)}')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def remove(self, **fields):
+        """Возвращает False, если удалять было нечего"""
+        return self.filter(**fields).delete()[0] > 0
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         max_length=200,
@@ -34,6 +111,12 @@ class Tag(models.Model):
     )
 
 
+class RecipeQuerySet(models.QuerySet):
+    def alive(self):
+        """Без рецептов, ожидающих удаления"""
+        return self.filter(deleted_at=None)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -64,12 +147,37 @@ class Recipe(models.Model):
         verbose_name='Теги'
     )
     cooking_time = models.PositiveIntegerField(
+        db_index=True,
         verbose_name='Время приготовления'
     )
     pub_date = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         verbose_name='Дата публикации'
     )
+    # JSON ингредиентов и тегов в формате API, см. recipes.snapshots
+    ingredients_snapshot = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Снимок ингредиентов'
+    )
+    tags_snapshot = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Снимок тегов'
+    )
+    # Удалённый рецепт скрыт из API, а связи удаляются
+    # фоновой задачей, см. recipes.deletion
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Удалён'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -117,6 +225,12 @@ class Cart(models.Model):
         related_name='consumers',
         verbose_name='В корзине'
     )
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Добавлен в корзину'
+    )
+
+    objects = UniqueRelationManager()
 
     class Meta:
         constraints = [
@@ -140,6 +254,12 @@ class Favourite(models.Model):
         related_name='users',
         verbose_name='В избранных'
     )
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Добавлен в избранное'
+    )
+
+    objects = UniqueRelationManager()
 
     class Meta:
         constraints = [
@@ -164,6 +284,8 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    objects = UniqueRelationManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -171,3 +293,55 @@ class Follow(models.Model):
                 name='unique follow'
             )
         ]
+
+
+class RecipeScore(models.Model):
+    """Предрассчитанная популярность рецепта для сортировки ленты"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.FloatField(
+        default=0,
+        verbose_name='Популярность'
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Популярность с затуханием'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['popular', 'recipe'],
+                         name='score_popular_idx'),
+            models.Index(fields=['trending', 'recipe'],
+                         name='score_trending_idx'),
+        ]
+
+
+class ImportProgress(models.Model):
+    """Прогресс import_recipes. Сохраняется в транзакции пачки,
+    поэтому загруженная пачка не повторится после обрыва"""
+    source = models.CharField(
+        max_length=500,
+        unique=True,
+        verbose_name='Файл выгрузки'
+    )
+    offset = models.BigIntegerField(
+        default=0,
+        verbose_name='Смещение в файле'
+    )
+    imported = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Загружено рецептов'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлён'
+    )
+
+    def __str__(self):
+        return f'{self.source}: {self.imported}'
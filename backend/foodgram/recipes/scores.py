@@ -0,0 +1,179 @@
+"""Популярность рецептов.
+
+popular — сумма весов добавлений в избранное и корзину.
+trending — log2(1 + S), где S — та же сумма, но каждое добавление
+весит 2 ** ((added_at - EPOCH) / HALFLIFE): свежие добавления через
+HALFLIFE весят вдвое больше старых. Веса растут со временем, а не
+затухают, поэтому счёт обновляется прибавлением без пересчёта
+остальных рецептов. В логарифме значение растёт на 1 за HALFLIFE
+и не переполняет double, а прибавление и вычитание слагаемого
+2 ** term считаются без возведения больших степеней
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections, router
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Greatest, Least, Log, Power
+
+from .models import Cart, Favourite, Recipe, RecipeScore, can_return_rows
+from .signals import scores_changed
+
+
+EPOCH = datetime(2022, 12, 1, tzinfo=timezone.utc)
+HALFLIFE = timedelta(days=7)
+
+WEIGHTS = {
+    Favourite: 1.0,
+    Cart: 0.5,
+}
+
+# Слагаемое меньше 2 ** -60 не меняет double; ограничение
+# показателя избавляет от потери значимости в POWER
+MAX_GAP = 60
+# Ближе к вычитаемому значение не уходит: иначе логарифм нуля
+MIN_GAP = 1e-12
+
+
+def get_term(model, added_at):
+    """log2 веса добавления в trending"""
+    return math.log2(WEIGHTS[model]) + (added_at - EPOCH) / HALFLIFE
+
+
+def log_add(a, b):
+    """log2(2 ** a + 2 ** b)"""
+    high, low = max(a, b), min(a, b)
+    if high == -math.inf:
+        return high
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def add_term(term):
+    """trending после прибавления 2 ** term"""
+    current = F('trending')
+    gap = Least(Abs(current - term), Value(MAX_GAP))
+    return Greatest(current, term) + Log(
+        Value(2.0), Value(1.0) + Power(Value(2.0), -gap))
+
+
+def subtract_term(term):
+    """trending после вычитания 2 ** term, не меньше нуля"""
+    current = F('trending')
+    gap = Greatest(
+        Least(term - current, Value(-MIN_GAP)), Value(-MAX_GAP))
+    return Greatest(current + Log(
+        Value(2.0), Value(1.0) - Power(Value(2.0), gap)), Value(0.0))
+
+
+def change_scores(model, relations, sign=1):
+    """Прибавляет (sign=1) или вычитает (sign=-1) вклад связей
+    [(recipe_id, added_at)] в счёт рецептов одним UPDATE"""
+    changes = defaultdict(lambda: [0.0, -math.inf])
+    for recipe_id, added_at in relations:
+        changes[recipe_id][0] += WEIGHTS[model] * sign
+        changes[recipe_id][1] = log_add(
+            changes[recipe_id][1], get_term(model, added_at))
+    if not changes:
+        return
+    change_term = add_term if sign > 0 else subtract_term
+    RecipeScore.objects.filter(recipe_id__in=changes).update(
+        popular=F('popular') + Case(
+            *[When(recipe_id=pk, then=Value(popular))
+              for pk, (popular, _) in changes.items()],
+            output_field=FloatField(),
+        ),
+        trending=Case(
+            *[When(recipe_id=pk, then=change_term(Value(term)))
+              for pk, (_, term) in changes.items()],
+            output_field=FloatField(),
+        ),
+    )
+    scores_changed.send(sender=RecipeScore, recipe_ids=list(changes))
+
+
+def delete_returning(queryset, fields):
+    """Удаляет строки queryset и возвращает значения fields
+    удалённых именно этим запросом строк"""
+    model = queryset.model
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    if not can_return_rows(connection):
+        deleted = []
+        for pk, *values in list(queryset.values_list('pk', *fields)):
+            if model.objects.filter(pk=pk).delete()[0]:
+                deleted.append(tuple(values))
+        return deleted
+    quote = connection.ops.quote_name
+    columns = [opts.get_field(name) for name in fields]
+    subquery, params = queryset.order_by().values(
+        'pk').query.sql_with_params()
+    returning = ', '.join(quote(field.column) for field in columns)
+    sql = (f'DELETE FROM {quote(opts.db_table)} '
+           f'WHERE {quote(opts.pk.column)} IN ({subquery}) '
+           f'RETURNING {returning}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    converters = []
+    for field in columns:
+        expression = field.get_col(opts.db_table)
+        converters.append([
+            (converter, expression)
+            for converter in connection.ops.get_db_converters(expression)
+            + field.get_db_converters(connection)
+        ])
+    result = []
+    for row in rows:
+        values = []
+        for value, field_converters in zip(row, converters):
+            for converter, expression in field_converters:
+                value = converter(value, expression, connection)
+            values.append(value)
+        result.append(tuple(values))
+    return result
+
+
+def remove_relations(model, queryset):
+    """Удаляет связи и вычитает вклад удалённых этим запросом:
+    строку, которую успел удалить параллельный запрос, вычел он.
+    Возвращает id рецептов удалённых связей"""
+    relations = delete_returning(queryset, ('recipe_id', 'added_at'))
+    change_scores(model, relations, sign=-1)
+    return {recipe_id for recipe_id, _ in relations}
+
+
+def compute_scores(recipe_ids):
+    """Счёт рецептов с нуля по всем связям"""
+    scores = {pk: [0.0, 0.0] for pk in recipe_ids}
+    for model, weight in WEIGHTS.items():
+        relations = model.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'added_at').iterator()
+        for recipe_id, added_at in relations:
+            scores[recipe_id][0] += weight
+            scores[recipe_id][1] = log_add(
+                scores[recipe_id][1], get_term(model, added_at))
+    return [
+        RecipeScore(recipe_id=pk, popular=popular, trending=trending)
+        for pk, (popular, trending) in scores.items()
+    ]
+
+
+def refresh_scores(batch_size=1000):
+    """Пересчитывает счёт всех рецептов пачками по batch_size.
+    Возвращает число обработанных рецептов"""
+    done = 0
+    last_id = 0
+    while True:
+        recipe_ids = list(Recipe.objects.filter(
+            pk__gt=last_id).order_by('pk').values_list(
+            'pk', flat=True)[:batch_size])
+        if not recipe_ids:
+            return done
+        scores = compute_scores(recipe_ids)
+        RecipeScore.objects.bulk_create(scores, ignore_conflicts=True)
+        RecipeScore.objects.bulk_update(scores, ['popular', 'trending'])
+        scores_changed.send(sender=RecipeScore, recipe_ids=recipe_ids)
+        done += len(recipe_ids)
+        last_id = recipe_ids[-1]
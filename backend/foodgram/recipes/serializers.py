@@ -1,15 +1,29 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import QueryDict
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from .fields import Base64ImageField
-from .models import (Cart, Favourite, Follow,
+from .models import (Cart, Favourite,
                      Ingredient, Recipe, RecipeIngredient, Tag)
-from users.serializers import UserSubscribedSerializer
+from .snapshots import build_snapshots
+from users.serializers import (FollowingListSerializer,
+                               UserSubscribedSerializer, get_following)
 
 
 User = get_user_model()
 
+RECIPE_IDS_LIMIT = 100
+
+# Именованные наборы полей рецепта для параметра view
+RECIPE_VIEWS = {
+    'card': ('id', 'name', 'image', 'cooking_time'),
+}
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов"""
@@ -53,6 +67,23 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeIngredientWriteSerializer(RecipeIngredientSerializer):
+    """Ингредиент рецепта при записи: id проверяются
+    в RecipeSerializer.validate_ingredients одним запросом"""
+    id = serializers.IntegerField(source='ingredient.id')
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Проверяет подписки на авторов страницы одним запросом"""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        if 'author' in self.child.fields:
+            get_following(self.context).prefetch(
+                recipe.author_id for recipe in recipes)
+        return super().to_representation(recipes)
+
+
 class GetRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для получения рецептов"""
     author = UserSubscribedSerializer(read_only=True)
@@ -79,9 +110,20 @@ class GetRecipeSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None and request.method in SAFE_METHODS:
+            requested = get_requested_fields(request.query_params)
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
+        if hasattr(obj, 'is_favorited'):
+            return user.is_authenticated and obj.is_favorited
         return user.is_authenticated and Favourite.objects.filter(
             user=user,
             recipe=obj
@@ -89,14 +131,42 @@ class GetRecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return user.is_authenticated and obj.is_in_shopping_cart
         return user.is_authenticated and Cart.objects.filter(
             user=user,
             recipe=obj
         ).exists()
 
+
+def get_field_names(query_params, param):
+    names = [name for name in query_params.get(param, '').split(',')
+             if name]
+    unknown = set(names) - set(GetRecipeSerializer.Meta.fields)
+    if unknown:
+        raise serializers.ValidationError({param: [
+            f'Неизвестные поля: {", ".join(sorted(unknown))}. '
+            f'Доступны: {", ".join(GetRecipeSerializer.Meta.fields)}'
+        ]})
+    return names
+
+
+def get_requested_fields(query_params):
+    """Поля рецепта по параметрам view, fields и omit"""
+    fields = RECIPE_VIEWS.get(
+        query_params.get('view'), GetRecipeSerializer.Meta.fields)
+    requested = get_field_names(query_params, 'fields')
+    if requested:
+        fields = tuple(name for name in fields if name in requested)
+    omitted = get_field_names(query_params, 'omit')
+    if omitted:
+        fields = tuple(name for name in fields if name not in omitted)
+    return fields
+
+
 class RecipeSerializer(GetRecipeSerializer):
     """Сериализатор для создания и изменения рецептов"""
-    ingredients = RecipeIngredientSerializer(
+    ingredients = RecipeIngredientWriteSerializer(
         many=True,
         source='ingredient'
     )
@@ -122,6 +192,45 @@ class RecipeSerializer(GetRecipeSerializer):
         )
         read_only_fields = ('image',)
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = self.parse_form(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def parse_form(data):
+        """multipart/form-data не передаёт вложенные структуры:
+        ingredients приходят JSON-строкой, tags — JSON-строкой
+        или повторяющимся полем"""
+        result = data.dict()
+        try:
+            if 'tags' in data:
+                tags = data.getlist('tags')
+                if len(tags) == 1 and tags[0].startswith('['):
+                    tags = json.loads(tags[0])
+                result['tags'] = tags
+            if 'ingredients' in data:
+                result['ingredients'] = json.loads(data['ingredients'])
+        except ValueError:
+            raise serializers.ValidationError(
+                {'error': 'Теги и ингредиенты должны быть JSON-списками'})
+        return result
+
+    def validate_ingredients(self, value):
+        """Заменяет id ингредиентов объектами одним запросом"""
+        ids = [param['ingredient']['id'] for param in value]
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in ingredients]
+        if missing:
+            raise serializers.ValidationError(
+                serializers.PrimaryKeyRelatedField.default_error_messages[
+                    'does_not_exist'].format(pk_value=missing[0]),
+                code='does_not_exist'
+            )
+        for param in value:
+            param['ingredient'] = ingredients[param['ingredient']['id']]
+        return value
+
     def validate(self, data):
         tags = data['tags']
         if not isinstance(tags, list):
@@ -154,7 +263,7 @@ class RecipeSerializer(GetRecipeSerializer):
             if amount < 1:
                 raise serializers.ValidationError(
                     {'error': ('Количество ингредиента должно '
-                                   'быть положительным числом')}
+                               'быть положительным числом')}
                 )
         if not data['cooking_time']:
             raise serializers.ValidationError(
@@ -163,7 +272,7 @@ class RecipeSerializer(GetRecipeSerializer):
                               'быть положительным числом')}
             )
         return data
-    
+
     @staticmethod
     def add_ingredients(recipe, ingredients):
         RecipeIngredient.objects.bulk_create(
@@ -171,30 +280,63 @@ class RecipeSerializer(GetRecipeSerializer):
                 recipe=recipe,
                 ingredient=param['ingredient'],
                 amount=param['amount']
-             ) for param in ingredients
-            ]
+            ) for param in ingredients]
         )
 
     def set_tags_ingredients(self, recipe, validated_data):
         tags = validated_data.get('tags')
-        recipe.tags.set(
-            Tag.objects.filter(pk__in=[tag.pk for tag in tags])
-        )
+        recipe.tags.set(tags)
         ingredients = validated_data.get('ingredient')
         self.add_ingredients(recipe, ingredients)
 
+    def to_representation(self, recipe):
+        # Ответ на запись читает ингредиенты и теги двумя запросами
+        prefetch_related_objects(
+            [recipe],
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient').order_by('id')
+            ),
+        )
+        return super().to_representation(recipe)
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл картинки после сохранения уже не нужен
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @staticmethod
+    def get_snapshots(validated_data):
+        """Снимки ингредиентов и тегов из проверенных данных,
+        без запросов к БД"""
+        return build_snapshots(
+            validated_data['tags'],
+            [(param['ingredient'], param['amount'])
+             for param in validated_data['ingredient']]
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         clean_data = dict(**validated_data)
         del clean_data['tags']
         del clean_data['ingredient']
+        clean_data.update(self.get_snapshots(validated_data))
         recipe = Recipe.objects.create(**clean_data)
         self.set_tags_ingredients(recipe, validated_data)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         clean_data = dict(**validated_data)
         del clean_data['tags']
         del clean_data['ingredient']
+        clean_data.update(self.get_snapshots(validated_data))
         super().update(recipe, clean_data)
         recipe.tags.clear()
         recipe.ingredients.clear()
@@ -210,42 +352,17 @@ class FavouriteCartRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavouriteRecipeSerializer(FavouriteCartRecipeSerializer):
-    """Сериализатор для избранных"""
-    def create(self, validated_data):
-        user = validated_data['user']
-        recipe = validated_data['recipe']
-        Favourite.objects.create(user=user, recipe=recipe)
-        return recipe
-
-    def validate(self, data):
-        user = self.context['request'].user
-        pk = self.context['request'].parser_context['kwargs']['pk']
-        recipe = get_object_or_404(Recipe, pk=pk)
-        if Favourite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'error': 'Рецепт уже добавлен в избранное'}
-            )
-        return data
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для массового изменения
+    избранного и покупок"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=RECIPE_IDS_LIMIT,
+        required=False
+    )
 
-
-class CartRecipeSerializer(FavouriteCartRecipeSerializer):
-    """Сериализатор для покупок"""
-    def create(self, validated_data):
-        user = validated_data['user']
-        recipe = validated_data['recipe']
-        Cart.objects.create(user=user, recipe=recipe)
-        return recipe
-
-    def validate(self, data):
-        user = self.context['request'].user
-        pk = self.context['request'].parser_context['kwargs']['pk']
-        recipe = get_object_or_404(Recipe, pk=pk)
-        if Cart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'error': 'Рецепт уже в корзине'}
-            )
-        return data
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -276,32 +393,13 @@ class FollowSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count',
         )
-
-    def validate(self, data):
-        if self.context['request'].method == 'POST':
-            follower = self.context['request'].user
-            following_pk = self.context[
-                'request'
-            ].parser_context['kwargs'].get('pk')
-            following = get_object_or_404(User, pk=following_pk)
-            if follower == following:
-                raise serializers.ValidationError(
-                    {'error': 'Нельзя подписаться на самого себя'}
-                )
-            if Follow.objects.filter(
-                follower=follower, following=following
-            ).exists():
-                raise serializers.ValidationError(
-                    {'error': 'Вы уже подписаны на этого пользователя'}
-                )
-        return data
+        list_serializer_class = FollowingListSerializer
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and Follow.objects.filter(
-            follower=user,
-            following=obj
-        ).exists()
+        return user.is_authenticated and obj.pk in get_following(self.context)
 
     def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.alive().count()
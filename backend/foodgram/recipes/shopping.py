@@ -0,0 +1,47 @@
+import io
+import os
+
+from django.conf import settings
+from django.db.models import Sum
+
+
+FONT_NAME = 'TimesNewRoman'
+
+
+def register_font():
+    """Регистрирует шрифт для pdf. reportlab импортируется только здесь:
+    он нужен редко, а его импорт заметно замедляет запуск воркера"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(
+            FONT_NAME,
+            os.path.join(settings.BASE_DIR, 'timesnewroman.ttf')
+        ))
+
+
+def build_shopping_list(user):
+    """Формирует pdf со списком покупок пользователя"""
+    from reportlab.pdfgen import canvas
+
+    register_font()
+    buffer = io.BytesIO()
+    file = canvas.Canvas(buffer)
+    file.setFont(FONT_NAME, 14)
+    file.drawString(200, 800,
+                    f'Список покупок пользователя {user.username}')
+    left = 50
+    bottom = 750
+    for unit in user.cart.filter(recipe__deleted_at=None).values(
+        'recipe_id__ingredient__ingredient__name',
+        'recipe_id__ingredient__ingredient__measurement_unit',
+    ).annotate(Sum('recipe_id__ingredient__amount')):
+        name = unit['recipe_id__ingredient__ingredient__name']
+        measure = unit['recipe_id__ingredient__ingredient__measurement_unit']
+        amount = unit['recipe_id__ingredient__amount__sum']
+        file.drawString(left, bottom, f'{name} ({measure}) - {amount}')
+        bottom -= 20
+    file.showPage()
+    file.save()
+    return buffer.getvalue()
@@ -0,0 +1,50 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import Ingredient, Recipe, RecipeScore, Tag
+from jobs.queue import enqueue
+
+
+# Изменения одним запросом без сигналов моделей (bulk_create,
+# bulk_update, UPDATE): recipe_ids — затронутые рецепты
+recipes_changed = Signal(providing_args=['recipe_ids'])
+scores_changed = Signal(providing_args=['recipe_ids'])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """Лента по популярности соединяется со счётом, поэтому
+    строка счёта нужна каждому рецепту"""
+    if created:
+        RecipeScore.objects.get_or_create(recipe=instance)
+
+
+def enqueue_snapshots(**payload):
+    transaction.on_commit(
+        partial(enqueue, 'refresh_recipe_snapshots', **payload))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    """Название и единица измерения входят в снимки рецептов"""
+    if not created:
+        enqueue_snapshots(ingredient=instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        enqueue_snapshots(tag=instance.pk)
+
+
+@receiver(pre_delete, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+def reference_deleted(sender, instance, **kwargs):
+    """После удаления связи уже не найти, поэтому рецепты
+    запоминаются до него"""
+    recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    if recipe_ids:
+        enqueue_snapshots(recipes=recipe_ids)
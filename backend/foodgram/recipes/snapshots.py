@@ -0,0 +1,142 @@
+"""Снимки ингредиентов и тегов рецепта.
+
+Recipe.ingredients_snapshot и tags_snapshot хранят JSON тех же списков,
+что отдаёт API, поэтому список и просмотр рецептов читают только
+таблицу рецептов. Снимок пишется вместе с рецептом в RecipeSerializer
+и пересобирается задачей refresh_recipe_snapshots после правки
+ингредиента или тега. Пустой снимок означает, что он ещё не построен:
+такие рецепты читаются из связанных таблиц
+"""
+import json
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Recipe, RecipeIngredient
+from .signals import recipes_changed
+
+
+RecipeTag = Recipe.tags.through
+
+SNAPSHOT_FIELDS = ('ingredients_snapshot', 'tags_snapshot')
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def tag_item(tag):
+    return {'id': tag.pk, 'name': tag.name, 'color': tag.color,
+            'slug': tag.slug}
+
+
+def ingredient_item(ingredient, amount):
+    return {
+        'id': ingredient.pk,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+        'amount': amount,
+    }
+
+
+def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = RecipeTag.objects.filter(recipe_id__in=recipe_ids).order_by(
+        'tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug')
+    for recipe_id, pk, name, color, slug in rows:
+        tags[recipe_id].append(
+            {'id': pk, 'name': name, 'color': color, 'slug': slug})
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).order_by('id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount')
+    for recipe_id, pk, name, measurement_unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': pk,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def build_snapshots(tags, ingredients):
+    """Значения полей снимка по тегам и парам (ингредиент, количество)
+    в порядке добавления"""
+    return {
+        'tags_snapshot': dumps([
+            tag_item(tag) for tag in sorted(tags, key=lambda tag: tag.pk)]),
+        'ingredients_snapshot': dumps([
+            ingredient_item(ingredient, amount)
+            for ingredient, amount in ingredients]),
+    }
+
+
+def compute_snapshots(recipe_ids):
+    """Снимки рецептов по связанным таблицам"""
+    tags = get_tags(recipe_ids)
+    ingredients = get_ingredients(recipe_ids)
+    return {
+        pk: {
+            'ingredients_snapshot': dumps(ingredients[pk]),
+            'tags_snapshot': dumps(tags[pk]),
+        }
+        for pk in recipe_ids
+    }
+
+
+def refresh_snapshots(recipe_ids):
+    """Пересобирает снимки рецептов. Возвращает число рецептов"""
+    with transaction.atomic():
+        # Блокировка не даёт записать снимок поверх параллельной правки
+        recipe_ids = list(Recipe.objects.filter(
+            pk__in=recipe_ids).select_for_update().values_list(
+            'pk', flat=True))
+        snapshots = compute_snapshots(recipe_ids)
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, **values) for pk, values in snapshots.items()],
+            SNAPSHOT_FIELDS
+        )
+        recipes_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+    return len(recipe_ids)
+
+
+def iterate_batches(queryset, batch_size):
+    """id рецептов из queryset пачками по возрастанию"""
+    last_id = 0
+    while True:
+        recipe_ids = list(queryset.filter(pk__gt=last_id).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not recipe_ids:
+            return
+        yield recipe_ids
+        last_id = recipe_ids[-1]
+
+
+def refresh_all(queryset=None, batch_size=1000):
+    """Пересобирает снимки рецептов queryset пачками.
+    Возвращает число рецептов"""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    return sum(
+        refresh_snapshots(recipe_ids)
+        for recipe_ids in iterate_batches(queryset, batch_size)
+    )
+
+
+def find_mismatches(batch_size=1000):
+    """id рецептов, чей снимок расходится со связанными таблицами"""
+    for recipe_ids in iterate_batches(Recipe.objects.all(), batch_size):
+        stored = Recipe.objects.filter(pk__in=recipe_ids).order_by(
+            'pk').values_list('pk', *SNAPSHOT_FIELDS)
+        expected = compute_snapshots(recipe_ids)
+        for pk, ingredients, tags in stored:
+            if (ingredients != expected[pk]['ingredients_snapshot']
+                    or tags != expected[pk]['tags_snapshot']):
+                yield pk
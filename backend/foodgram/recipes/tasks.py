@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from jobs.queue import register
+from .deletion import PURGE_JOB, purge_deleted
+from .models import Recipe
+from .shopping import build_shopping_list
+from .snapshots import refresh_all
+
+
+@register('shopping_list')
+def shopping_list(job):
+    return 'pdf', build_shopping_list(job.user)
+
+
+@register('refresh_recipe_snapshots')
+def refresh_recipe_snapshots(job):
+    """Пересобирает снимки рецептов с ингредиентом ingredient,
+    тегом tag или из списка recipes; без параметров — всех"""
+    data = job.data
+    queryset = Recipe.objects.all()
+    if 'ingredient' in data:
+        queryset = queryset.filter(ingredients=data['ingredient'])
+    if 'tag' in data:
+        queryset = queryset.filter(tags=data['tag'])
+    if 'recipes' in data:
+        queryset = queryset.filter(pk__in=data['recipes'])
+    refresh_all(queryset, settings.SNAPSHOT_BATCH_SIZE)
+
+
+@register(PURGE_JOB)
+def purge(job):
+    purge_deleted()
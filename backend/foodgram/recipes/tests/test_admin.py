@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+
+from recipes.admin import is_unfiltered
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class IsUnfilteredTest(SimpleTestCase):
+
+    def test_alive_only(self):
+        self.assertTrue(is_unfiltered(Recipe.objects.all()))
+        self.assertTrue(is_unfiltered(Recipe.objects.alive()))
+        self.assertTrue(is_unfiltered(User.objects.alive()))
+
+    def test_filtered(self):
+        self.assertFalse(is_unfiltered(
+            Recipe.objects.alive().filter(name__istartswith='суп')))
+        self.assertFalse(is_unfiltered(
+            Recipe.objects.filter(deleted_at__isnull=False)))
+        self.assertFalse(is_unfiltered(
+            Recipe.objects.exclude(deleted_at=None)))
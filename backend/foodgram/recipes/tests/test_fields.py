@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class RecipeFieldsTest(APITestCase):
+
+    def setUp(self):
+        author = User.objects.create(
+            username='author', email='author@example.com')
+        Recipe.objects.create(
+            author=author, name='Суп', image='recipes/images/soup.png',
+            text='Сварить', cooking_time=30)
+
+    def test_requested_fields(self):
+        response = self.client.get(
+            '/api/recipes/', {'fields': 'id,name', 'omit': 'name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]), ['id'])
+
+    def test_unknown_fields(self):
+        for param in ('fields', 'omit'):
+            response = self.client.get(
+                '/api/recipes/', {param: 'name,bogus,extra'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('bogus, extra', response.data[param][0])
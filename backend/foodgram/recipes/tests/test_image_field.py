@@ -0,0 +1,52 @@
+import base64
+import io
+import os
+import textwrap
+
+from PIL import Image
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from recipes.fields import CHUNK_SIZE, Base64ImageField
+
+
+def make_png():
+    """PNG из шума, больше нескольких частей CHUNK_SIZE в base64"""
+    image = Image.frombytes('RGB', (256, 256), os.urandom(256 * 256 * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+
+    def setUp(self):
+        self.content = make_png()
+        self.encoded = base64.b64encode(self.content).decode()
+        self.assertGreater(len(self.encoded), CHUNK_SIZE * 2)
+
+    def decode(self, encoded):
+        file = Base64ImageField.decode('data:image/png;base64,' + encoded)
+        try:
+            return file.read()
+        finally:
+            file.close()
+
+    def test_wrapped_payload(self):
+        """Переносы по 76 символов, как у base64 из MIME"""
+        wrapped = '\r\n'.join(textwrap.wrap(self.encoded, 76))
+        self.assertEqual(self.decode(wrapped), self.content)
+
+    def test_whitespace_after_first_chunk(self):
+        """Один перенос после первой части сдвигает границы
+        следующих частей на символ"""
+        start = CHUNK_SIZE + 1
+        encoded = self.encoded[:start] + '\n' + self.encoded[start:]
+        self.assertEqual(self.decode(encoded), self.content)
+
+    def test_invalid_payload_rejected(self):
+        field = Base64ImageField()
+        for encoded in (self.encoded[:-1], self.encoded[:100] + '*'
+                        + self.encoded[100:]):
+            with self.assertRaises(ValidationError):
+                field.to_internal_value('data:image/png;base64,' + encoded)
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from recipes.management.commands.import_recipes import Command
+from recipes.models import ImportProgress, Recipe, Tag
+
+
+User = get_user_model()
+
+
+def recipe_line(index, image=None):
+    return json.dumps({
+        'author': 'author',
+        'name': f'Рецепт {index}',
+        'text': 'Приготовить',
+        'cooking_time': 10,
+        'pub_date': '2022-12-01T10:00:00+00:00',
+        'image': image,
+        'tags': [{'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'}],
+        'ingredients': [
+            {'name': 'Соль', 'measurement_unit': 'г', 'amount': 5}],
+    }, ensure_ascii=False)
+
+
+class ImportResumeTest(TransactionTestCase):
+
+    def setUp(self):
+        User.objects.create(username='author', email='author@example.com')
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'recipes.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, lines):
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write('\n'.join(lines) + '\n')
+
+    def load(self):
+        call_command('import_recipes', self.directory.name,
+                     batch_size=2, stdout=io.StringIO())
+
+    def test_resume_after_failed_batch(self):
+        lines = [recipe_line(index) for index in range(5)]
+        self.write(lines[:3] + ['{обрыв'] + lines[4:])
+        with self.assertRaises(ValueError):
+            self.load()
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(ImportProgress.objects.get().imported, 2)
+        self.write(lines)
+        self.load()
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', flat=True)),
+            [f'Рецепт {index}' for index in range(5)])
+
+    def test_crash_before_progress_is_saved(self):
+        self.write([recipe_line(index) for index in range(5)])
+        with mock.patch.object(Command, 'save', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                self.load()
+        self.load()
+        self.assertEqual(Recipe.objects.count(), 5)
+
+    def test_tag_color_taken(self):
+        Tag.objects.create(name='Ужин', color='#49B64E', slug='dinner')
+        self.write([recipe_line(0)])
+        self.load()
+        tag = Tag.objects.get(slug='lunch')
+        self.assertNotEqual(tag.color, '#49B64E')
+        self.assertRegex(tag.color, r'^#[\dA-F]{6}$')
+
+    def test_rolled_back_batch_deletes_images(self):
+        os.mkdir(os.path.join(self.directory.name, 'images'))
+        with open(os.path.join(
+                self.directory.name, 'images', 'soup.png'), 'wb') as image:
+            image.write(b'png')
+        self.write([recipe_line(0, 'images/soup.png')])
+        with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media):
+            with mock.patch.object(Command, 'save', side_effect=SystemExit):
+                with self.assertRaises(SystemExit):
+                    self.load()
+            self.assertEqual(
+                os.listdir(os.path.join(media, 'recipes', 'images')), [])
+            self.load()
+            self.assertEqual(
+                os.listdir(os.path.join(media, 'recipes', 'images')),
+                ['soup.png'])
@@ -0,0 +1,109 @@
+import threading
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from recipes.models import Cart, Favourite, Follow, Recipe, RecipeScore
+
+
+User = get_user_model()
+
+
+class UniqueRelationTest(APITransactionTestCase):
+    """Повторное добавление и удаление связей без транзакции
+    вокруг теста, как в рабочем запросе"""
+
+    def setUp(self):
+        self.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        self.author = User.objects.create(
+            username='author', email='author@example.com')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', image='recipes/images/soup.png',
+            text='Сварить', cooking_time=30)
+        self.client.force_authenticate(self.user)
+
+    def test_add_twice_inserts_once(self):
+        for model in (Favourite, Cart):
+            self.assertTrue(
+                model.objects.add(user=self.user, recipe=self.recipe))
+            self.assertFalse(
+                model.objects.add(user=self.user, recipe=self.recipe))
+            self.assertEqual(model.objects.count(), 1)
+
+    def test_remove_missing(self):
+        self.assertFalse(Follow.objects.remove(
+            follower=self.user, following=self.author))
+
+    def test_bookmark_endpoints(self):
+        for name in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipe.pk}/{name}/'
+            self.assertEqual(self.client.post(url).status_code, 201)
+            self.assertEqual(self.client.post(url).status_code, 400)
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 400)
+        score = RecipeScore.objects.get(recipe=self.recipe)
+        self.assertAlmostEqual(score.popular, 0)
+
+    def test_subscribe_endpoint(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+
+    def post_concurrently(self, url, data=None, threads=4):
+        """Отправляет одинаковые POST из нескольких потоков разом,
+        у каждого потока своё соединение с БД"""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite в памяти не даёт параллельных '
+                          'соединений, задайте DB_TEST_NAME')
+        barrier = threading.Barrier(threads)
+        responses = []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                responses.append(client.post(url, data, format='json'))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=post) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return responses
+
+    def test_concurrent_add(self):
+        responses = self.post_concurrently(
+            f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(
+            sorted(response.status_code for response in responses),
+            [201, 400, 400, 400])
+        self.assertEqual(Favourite.objects.count(), 1)
+        score = RecipeScore.objects.get(recipe=self.recipe)
+        self.assertAlmostEqual(score.popular, 1)
+
+    def test_concurrent_bulk_add(self):
+        """Связь, вставленную параллельным запросом, не считают
+        добавленной дважды"""
+        other = Recipe.objects.create(
+            author=self.author, name='Каша', image='recipes/images/soup.png',
+            text='Сварить', cooking_time=10)
+        ids = [self.recipe.pk, other.pk]
+        responses = self.post_concurrently(
+            '/api/recipes/shopping_cart/', {'recipes': ids})
+        added = Counter(
+            item['id'] for response in responses
+            for item in response.json()['results']
+            if item['status'] == 'added')
+        self.assertEqual(added, Counter(ids))
+        self.assertEqual(Cart.objects.count(), 2)
+        for score in RecipeScore.objects.filter(recipe_id__in=ids):
+            self.assertAlmostEqual(score.popular, 0.5)
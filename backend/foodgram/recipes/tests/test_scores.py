@@ -0,0 +1,107 @@
+import importlib
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from recipes import scores
+from recipes.models import Cart, Favourite, Recipe, RecipeScore
+from recipes.scores import (EPOCH, HALFLIFE, change_scores, compute_scores,
+                            remove_relations)
+
+
+User = get_user_model()
+
+
+class ScoresTest(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create(username=f'user{index}',
+                                email=f'user{index}@example.com')
+            for index in range(3)
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.users[0], name='Суп', image='recipes/images/soup.png',
+            text='Сварить', cooking_time=30)
+
+    def add(self, model, user, added_at):
+        model.objects.create(user=user, recipe=self.recipe, added_at=added_at)
+        change_scores(model, [(self.recipe.pk, added_at)])
+
+    def assert_score_consistent(self):
+        stored = RecipeScore.objects.get(recipe=self.recipe)
+        expected = compute_scores([self.recipe.pk])[0]
+        self.assertAlmostEqual(stored.popular, expected.popular)
+        self.assertAlmostEqual(stored.trending, expected.trending, places=9)
+
+    def test_add_and_remove(self):
+        for index, user in enumerate(self.users):
+            self.add(Favourite, user, EPOCH + HALFLIFE * index * 3)
+            self.add(Cart, user, EPOCH + HALFLIFE * index)
+            self.assert_score_consistent()
+        remove_relations(Favourite, Favourite.objects.filter(
+            user=self.users[2]))
+        self.assert_score_consistent()
+        remove_relations(Cart, Cart.objects.all())
+        remove_relations(Favourite, Favourite.objects.all())
+        score = RecipeScore.objects.get(recipe=self.recipe)
+        self.assertEqual((score.popular, score.trending), (0, 0))
+
+    def test_bounded_far_from_epoch(self):
+        moment = EPOCH + timedelta(days=365 * 100)
+        self.add(Favourite, self.users[0], moment)
+        self.add(Favourite, self.users[1], moment + HALFLIFE)
+        self.assert_score_consistent()
+        self.assertAlmostEqual(
+            RecipeScore.objects.get(recipe=self.recipe).trending,
+            (moment - EPOCH) / HALFLIFE + 1 + 0.5849625007, places=6)
+        remove_relations(Favourite, Favourite.objects.filter(
+            user=self.users[1]))
+        self.assert_score_consistent()
+
+    def test_removal_counted_once(self):
+        for user in self.users:
+            self.add(Favourite, user, EPOCH)
+        relations = Favourite.objects.filter(user=self.users[0])
+        for can_return in (True, False):
+            with mock.patch.object(scores, 'can_return_rows',
+                                   return_value=can_return):
+                self.assertEqual(remove_relations(Favourite, relations),
+                                 {self.recipe.pk} if can_return else set())
+            self.assert_score_consistent()
+        with mock.patch.object(scores, 'can_return_rows',
+                               return_value=False):
+            self.assertEqual(remove_relations(
+                Favourite, Favourite.objects.all()), {self.recipe.pk})
+        self.assert_score_consistent()
+
+    def test_migration_matches_compute_scores(self):
+        """Счёт из миграции 0006 для связей с одним added_at"""
+        migration = importlib.import_module(
+            'recipes.migrations.0006_recipe_scores')
+        moment = EPOCH + timedelta(days=365 * 3)
+        Favourite.objects.create(
+            user=self.users[0], recipe=self.recipe, added_at=moment)
+        Cart.objects.create(
+            user=self.users[1], recipe=self.recipe, added_at=moment)
+        expected = compute_scores([self.recipe.pk])[0]
+        self.assertAlmostEqual(
+            migration.get_trending(1.5, (moment - EPOCH) / HALFLIFE),
+            expected.trending, places=9)
+        self.assertEqual(migration.get_trending(0, 100.0), 0)
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_ordering_keeps_recipes_without_score(self):
+        self.add(Favourite, self.users[1], EPOCH)
+        unscored = Recipe.objects.create(
+            author=self.users[0], name='Каша', image='recipes/images/soup.png',
+            text='Сварить', cooking_time=10)
+        RecipeScore.objects.filter(recipe=unscored).delete()
+        for ordering in ('popular', 'trending'):
+            response = self.client.get(
+                '/api/recipes/', {'ordering': ordering})
+            self.assertEqual(
+                [recipe['id'] for recipe in response.json()['results']],
+                [self.recipe.pk, unscored.pk])
@@ -1,13 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from recipes.admin import LargeTableAdmin, SoftDeleteAdmin
+from recipes.deletion import soft_delete_user
+
 
 User = get_user_model()
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(SoftDeleteAdmin, LargeTableAdmin):
     list_display = ('username', 'email')
-    list_filter = ('username', 'email')
+    list_filter = ('is_active', 'is_staff')
+    search_fields = ('^username', '^email')
+    soft_delete = staticmethod(soft_delete_user)
 
 
 admin.site.register(User, UserAdmin)
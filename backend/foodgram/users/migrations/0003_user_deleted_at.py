@@ -0,0 +1,25 @@
+# Generated by Django 2.2.19 on 2026-10-19 09:10
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='foodgramuser',
+            managers=[
+                ('objects', users.models.FoodgramUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Удалён'),
+        ),
+    ]
@@ -1,8 +1,18 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
 from django.db import models
 
 
+class UserQuerySet(models.QuerySet):
+    def alive(self):
+        """Без пользователей, ожидающих удаления"""
+        return self.filter(deleted_at=None)
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class FoodgramUser(AbstractUser):
     email = models.EmailField(
         max_length=254,
@@ -27,6 +37,16 @@ class FoodgramUser(AbstractUser):
         max_length=150,
         verbose_name='Пароль'
     )
+    # Удалённый пользователь скрыт из API, а его данные удаляются
+    # фоновой задачей, см. recipes.deletion
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Удалён'
+    )
+
+    objects = FoodgramUserManager()
 
     class Meta:
         ordering = ['-id']
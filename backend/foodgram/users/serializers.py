@@ -7,6 +7,50 @@ from recipes.models import Follow
 User = get_user_model()
 
 
+class FollowingMemo:
+    """Подписки пользователя запроса на уже проверенных авторов.
+
+    Хранится в контексте сериализатора, поэтому все вложенные
+    сериализаторы одного ответа проверяют подписки одним запросом
+    на страницу, а не запросом на каждого автора
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.checked = set()
+        self.following = set()
+
+    def prefetch(self, ids):
+        ids = set(ids) - self.checked
+        if not ids or not self.user.is_authenticated:
+            return
+        self.following.update(Follow.objects.filter(
+            follower=self.user, following_id__in=ids
+        ).values_list('following_id', flat=True))
+        self.checked.update(ids)
+
+    def __contains__(self, pk):
+        self.prefetch([pk])
+        return pk in self.following
+
+
+def get_following(context):
+    """FollowingMemo из контекста сериализатора, создаётся при
+    первом обращении"""
+    if 'following' not in context:
+        context['following'] = FollowingMemo(context['request'].user)
+    return context['following']
+
+
+class FollowingListSerializer(serializers.ListSerializer):
+    """Проверяет подписки на всех пользователей страницы заранее"""
+
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        get_following(self.context).prefetch(user.pk for user in users)
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор формы регистрации пользователя"""
     class Meta:
@@ -27,13 +71,13 @@ class UserSubscribedSerializer(UserSerializer):
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('is_subscribed',)
+        list_serializer_class = FollowingListSerializer
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and Follow.objects.filter(
-            follower=user,
-            following=obj
-        ).exists()
+        if not user.is_authenticated or user.pk == obj.pk:
+            return False
+        return obj.pk in get_following(self.context)
 
 
 class UserSetPasswordSerializer(UserSerializer):